@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Startup time regression check for dns_enum.py.
+
+Imports dns_enum under `python -X importtime` and fails if the import takes
+longer than --max-ms or pulls in a stage dependency which must stay lazy.
+"""
+import os
+import re
+import sys
+import argparse
+import subprocess
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+# heavy or network related modules which only specific stages need
+LAZY_MODULES = ['requests', 'urllib3', 'dns.resolver', 'dnslib', 'tld', 'tldextract', 'lib.dnsgen', 'lib.ip_enrichment', 'lib.update_resolvers']
+
+IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def measure():
+    """Returns (cumulative microseconds of dns_enum, imported module names)."""
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import dns_enum'],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True)
+
+    total = 0
+    modules = set()
+    for line in proc.stderr.decode().splitlines():
+        m = IMPORTTIME_RE.match(line)
+        if not m:
+            continue
+
+        modules.add(m.group(4))
+        if m.group(4) == 'dns_enum':
+            total = int(m.group(2))
+
+    return total, modules
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--max-ms', help="allowed import time of dns_enum", type=float, default=100.0)
+    parser.add_argument('-n', '--runs', help="runs, the best one is reported", type=int, default=5)
+
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    runs = [measure() for _ in range(args.runs)]
+    best = min(total for total, _ in runs) / 1000
+    modules = set.union(*[m for _, m in runs])
+
+    print (f"(*) dns_enum import time: {best:.1f} ms (limit {args.max_ms} ms)")
+
+    failed = False
+    eager = [m for m in LAZY_MODULES if m in modules]
+    if eager:
+        print (f"(-) Imported at startup, must be lazy: {', '.join(eager)}")
+        failed = True
+
+    if best > args.max_ms:
+        print ("(-) Startup is slower than the limit")
+        failed = True
+
+    if failed:
+        sys.exit(1)
+
+    print ("(+) OK")
+
+if __name__ == '__main__':
+    main()
@@ -2,15 +2,15 @@ import os
 import sys
 import argparse
 import csv
+import time
+import logging
 
-import dnsgen
+from lib.enumerator import Enumerator, EnumeratorConfig
+from lib.records import DEFAULT_TYPES, parse_types
+from lib.wordlist import compile_wordlist, compiled_path, count_hits
 
-from lib.update_resolvers import DnsResolverProvider
-from lib.mass_resolver import MassDnsResolver
-
-from lib.amass import run_amass
-from lib.ip_enrichment import IPEnricher
-from lib.dnsgen import generate
+#stage modules (amass, dnsgen, enrichment, resolver checks) pull in heavy
+#dependencies, so they are imported only when their stage is enabled
 
 args = {'dns_checker_threads':100}
 
@@ -25,29 +25,68 @@ def parse_args():
     parser.error = parser_error
     parser._optionals.title = "OPTIONS"
     parser.add_argument('--update-mass-resolvers', help="check mass resolvers", action='store_true')
+    parser.add_argument('--full-resolver-check', help="with --update-mass-resolvers, recheck every resolver instead of new and stale ones", action='store_true')
+    parser.add_argument('--resolvers-max-age', help="days after which a mass resolver is checked again", type=float, default=7)
+    parser.add_argument('--compile-wordlist', help="compile the wordlists into the binary format (deduplicated, ordered by past hits)", action='store_true')
     parser.add_argument('--enrich', help="enrich resolved domains with data from whois", action='store_true')
+    parser.add_argument('--ptr-sweep', help="reverse DNS sweep of routes found by --enrich, in-scope PTR names are added to the results", action='store_true')
+    parser.add_argument('--ptr-max-prefix', help="largest IPv4 route swept by --ptr-sweep (prefix length)", type=int, default=24)
+    parser.add_argument('--ptr-max-prefix-v6', help="largest IPv6 route swept by --ptr-sweep (prefix length)", type=int, default=120)
     parser.add_argument('--amass', help="check with passive amass checks", action='store_true')
     parser.add_argument('--brute', help="try to domain bruteforce", action='store_true')
     parser.add_argument('--altmutations', help="try to find mutations", action='store_true')
     parser.add_argument('--amass-timeout', help="amass timout", default=120)
+    parser.add_argument('--amass-workers', help="amass processes running at once across root domains", type=int, default=4)
     parser.add_argument('--debug', help="debug", action='store_true')
+    parser.add_argument('--threads', help="massdns concurrent queries (-s)", type=int, default=1000)
+    parser.add_argument('--checker-threads', help="threads checking mass resolvers", type=int, default=1000)
+    parser.add_argument('--adaptive-rate', help="adjust massdns concurrency to the timeout/SERVFAIL rate (AIMD)", action='store_true')
+    parser.add_argument('--min-threads', help="lowest concurrency for --adaptive-rate", type=int, default=50)
+    parser.add_argument('--max-threads', help="highest concurrency for --adaptive-rate", type=int, default=10000)
+    parser.add_argument('--max-failure-rate', help="timeout+SERVFAIL share above which --adaptive-rate backs off", type=float, default=0.05)
+    parser.add_argument('--monitor', help="watch names from raw_*.csv in the output dir, re-resolve them when their TTL expires", action='store_true')
+    parser.add_argument('--monitor-batch', help="max names re-resolved per monitor cycle", type=int, default=5000)
+    parser.add_argument('--monitor-min-interval', help="min seconds between re-resolutions of a name", type=int, default=300)
+    parser.add_argument('--monitor-max-interval', help="max seconds between re-resolutions of a name", type=int, default=86400)
+    parser.add_argument('--monitor-max-misses', help="incomplete (timed out) resolutions of a name in a row before its partial answer is reported", type=int, default=3)
+    parser.add_argument('--monitor-cycles', help="stop after this many monitor cycles (default: run forever)", type=int)
+    parser.add_argument('--profile', help="profile every stage: sample, cprofile, mem (default: sample), dumps go to the output dir", nargs='?', const='sample')
+    parser.add_argument('--types', help="record types to resolve in one pass, e.g. A,AAAA,CNAME,MX,TXT", default=','.join(DEFAULT_TYPES))
+    parser.add_argument('--budget', help="max queries per brute/altmutations stage, highest-yield labels go first", type=int)
+    parser.add_argument('--min-yield', help="stop a stage once a chunk resolves less than this share of queries", type=float, default=0.0)
+    parser.add_argument('--stats-file', help="hit statistics store", default=os.path.join('stats', 'hit_stats.json'))
 
     parser.add_argument('-w','--wordlist', help="dns names wordlist", default='n0kovo_subdomains_small.txt')
+    parser.add_argument('--alt-depth', help="altmutations rounds, names found by a round seed the next one", type=int, default=1)
     parser.add_argument('--alt-wordlist', help="alt mutations wordlist", default='altmutations.txt')
     parser.add_argument('-d','--domain', help="domain to brute")
     parser.add_argument('-df','--domain-file', help="file with domains to brute")
+    parser.add_argument('-x','--exclude', help="comma separated domains excluded from the scope with all their subdomains")
 
     parser.add_argument('-o','--output-dir', help="directory for results", default='output')
+    parser.add_argument('--history-db', help="SQLite store every run is ingested into, query it with python3 -m lib.history (default: results/history.db)")
+    parser.add_argument('--no-history', help="don't ingest this run into the history store", action='store_true')
 
     return parser.parse_args()
 
 
+def save_results(path, records):
+    with open(path, 'w', encoding='utf8', newline='') as output_file:
+        fc = csv.DictWriter(output_file, fieldnames=records[0].keys())
+        fc.writeheader()
+        fc.writerows(records)
+
+
 def main():
     args = parse_args()
 
+    #progress of the library stages goes through logging, the CLI prints it as is
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stdout)
+
     trusted_resolvers_path = os.path.normpath(os.path.realpath(os.path.dirname(__file__)) + "/dicts/trusted_resolvers.txt")
     mass_resolvers_unchecked_path = os.path.normpath(os.path.realpath(os.path.dirname(__file__)) + "/dicts/mass_resolvers_unchecked.txt")
     mass_resolvers_path = os.path.normpath(os.path.realpath(os.path.dirname(__file__)) + "/dicts/mass_resolvers.txt")
+    mass_resolvers_state_path = os.path.normpath(os.path.realpath(os.path.dirname(__file__)) + "/dicts/mass_resolvers_state.json")
     wordlist_path = os.path.normpath(os.path.realpath(os.path.dirname(__file__)) + "/dicts/" + args.wordlist)
     altmutations_path = os.path.normpath(os.path.realpath(os.path.dirname(__file__)) + "/dicts/" + args.alt_wordlist)
 
@@ -58,16 +97,57 @@ def main():
 
     debug = args.debug
 
-    resolver = MassDnsResolver(
-        trusted_resolvers_path = trusted_resolvers_path,
-        mass_resolvers_path = mass_resolvers_path,
-        temp_directory_path = temp_directory_path,
-        threads=1000
-        )
+    try:
+        types = parse_types(args.types)
+    except ValueError as err:
+        parser_error(str(err))
+
+    if args.ptr_sweep and not args.enrich:
+        parser_error("--ptr-sweep needs routes from --enrich")
 
     if not os.path.exists(args.output_dir):
         os.makedirs(args.output_dir)
 
+    #load domains
+    root_domains = []
+    if args.domain:
+        root_domains = [args.domain]
+    elif args.domain_file:
+        with open(args.domain_file) as f:
+            root_domains = [s.strip() for s in f.readlines() if s.strip()]
+
+    excludes = [d.strip() for d in args.exclude.split(',') if d.strip()] if args.exclude else []
+
+    config = EnumeratorConfig(
+        amass=args.amass,
+        brute=args.brute,
+        altmutations=args.altmutations,
+        enrich=args.enrich,
+        ptr_sweep=args.ptr_sweep,
+        ptr_max_prefix=args.ptr_max_prefix,
+        ptr_max_prefix_v6=args.ptr_max_prefix_v6,
+        types=types,
+        root_domains=root_domains,
+        exclude=excludes,
+        wordlist=wordlist_path,
+        alt_wordlist=altmutations_path,
+        alt_depth=args.alt_depth,
+        amass_timeout=args.amass_timeout,
+        amass_workers=args.amass_workers,
+        budget=args.budget,
+        min_yield=args.min_yield,
+        threads=args.threads,
+        adaptive_rate=args.adaptive_rate,
+        min_threads=args.min_threads,
+        max_threads=args.max_threads,
+        max_failure_rate=args.max_failure_rate,
+        rate_log_path=os.path.join(args.output_dir, 'rate_history.csv'),
+        trusted_resolvers_path=trusted_resolvers_path,
+        mass_resolvers_path=mass_resolvers_path,
+        temp_directory_path=temp_directory_path,
+        amass_config_path=amass_config_path,
+        stats_path=os.path.normpath(os.path.join(os.path.realpath(os.path.dirname(__file__)), args.stats_file)))
+
     #load and update dns resolvers list
     if args.update_mass_resolvers or not os.path.exists(mass_resolvers_path):
 
@@ -76,12 +156,23 @@ def main():
 
         print ('(*) Updating mass resolvers...')
 
-        dns_provider = DnsResolverProvider(1000)
+        from lib.update_resolvers import DnsResolverProvider, ResolverState, refresh_resolvers
+
+        dns_provider = DnsResolverProvider(args.checker_threads)
+        state = ResolverState(mass_resolvers_state_path)
         with open (mass_resolvers_unchecked_path) as f:
             resolver_list = [s.strip() for s in f.readlines()]
 
         candidate_resolver_list = list(set(resolver_list))
-        good_resolvers = dns_provider.get_good_resolvers(resolver_list=candidate_resolver_list)
+        refresh_resolvers(
+            provider=dns_provider,
+            candidates=candidate_resolver_list,
+            state=state,
+            max_age=args.resolvers_max_age * 86400,
+            full=args.full_resolver_check)
+        state.save()
+
+        good_resolvers = state.good(within=set(candidate_resolver_list))
 
         with open(mass_resolvers_path,'w') as f:
             f.write('\n'.join(good_resolvers))
@@ -90,137 +181,123 @@ def main():
         print ('(*) Done')
 
 
-    #load the subdomain wordlist
-    with open(wordlist_path) as f:
-        subodomains = [s.strip() for s in f.readlines()]
-        print (f"(*) {len(subodomains)} subdomains have been loaded")
+    if args.compile_wordlist:
+        hits = count_hits(args.output_dir)
+        for path in [wordlist_path, altmutations_path]:
+            count = compile_wordlist(path, compiled_path(path), hits=hits)
+            print (f"(+) {count} labels have been compiled to {compiled_path(path)}")
 
-    #load domains
-    root_domains = []
-    if args.domain:
-        root_domains = [args.domain]
-    elif args.domain_file:
-        with open(args.domain_file) as f:
-            root_domains = [s.strip() for s in f.readlines()]
-
-
-    print (f"(*) We\'re going to check the following root domains: {','.join(root_domains)}")
-
-    for root_domain in root_domains:
-        resolved_results = []
+    profiler = None
+    if args.profile:
+        from lib.profiling import MODES, StageProfiler
 
-        #amass
-        if args.amass:
-            print (f"(*) Running Amass. Timeout is set to {args.amass_timeout}")
-            amass_domains = run_amass(
-                domain=root_domain,
-                config_path=amass_config_path,
-                temp_dir=temp_directory_path,
-                timeout=args.amass_timeout)
-
-            print (f"(+) {len(amass_domains)} domains found")
-            for d in amass_domains:
-                print (d)
-
-            print ("(*) Resolving Amass results...")
-            domains_to_check = [domain['name'] for domain in amass_domains]
-            domains_to_check = list(set(domains_to_check))
-
-            resolved_domains = resolver.trusted_resolve(domains=domains_to_check, types=['A','CNAME'])
-            resolved_names = [d['name'] for d in resolved_domains if root_domain in d['name']]
-
-            print (f"(+) {len(resolved_names)} domains were resolved:")
-            for d in resolved_domains:
-                print (d)
-
-            for result in resolved_domains:
-                if not result in resolved_results:
-                    resolved_results.append(result)
-                  
-        #bruteforce
-        if args.brute:
-            print ("(*) Running bruteforce...")
-            #subodomains = subodomains[:10]
-            domains_to_check = [f"{subdomain}.{root_domain}" for subdomain in subodomains]
-
-            #print (f"Domains to check: {domains_to_check}")
-
-            resolved_domains = resolver.mass_resolve(domains=domains_to_check, types=['A','CNAME'],  recheck=True)
-            for result in resolved_domains:
-                if not result in resolved_results:
-                    resolved_results.append(result)
-
-            resolved_names = [d['name'] for d in resolved_results if root_domain in d['name']]
-
-        print (f"(+) {len(resolved_domains)} records were found (CNAME+A)")
-        print ( "(+) Domains:")
-        for name in resolved_names:
-            print (f"{name}")
-        
-
-        if args.altmutations:
-            print (f"(*) Generating altmutations for {len(resolved_names)} domains")
-            mutated = list(generate(domains=resolved_names, wordlist=altmutations_path))
-            print (mutated[:10])
-            print (f"(+) {len(mutated)} permutations were generated")
-
-            print (f"(*) Resolving altmutations...")
-            resolved_domains_mutated = resolver.mass_resolve(domains=mutated, types=['A','CNAME'],  recheck=True)
-            for result in resolved_domains_mutated:
-                if not result in resolved_results:
-                    resolved_results.append(result)
-
-            print (f"(+) {len(resolved_domains_mutated)} records were found (CNAME+A)")
-
-        #additinly add amass results which were not resolved
-        if args.amass:
-            resolved_results_names = [d['name'] for d in resolved_results]
+        modes = [m.strip() for m in args.profile.split(',') if m.strip()]
+        if any(m not in MODES for m in modes):
+            parser_error(f"--profile accepts {','.join(MODES)}")
 
-            for d in amass_domains:
-                if not d['name'] in resolved_results_names:
-                    print (f"unresolved amass domain: {d}")
-                    resolved_results.append({'name':d['name'],'data':'','type':'A'})
+        profiler = StageProfiler(args.output_dir, modes=modes)
 
-        if args.altmutations:
-            #print (list(mutated))
-            resolved_names_mutated = [d['name'] for d in resolved_domains_mutated if root_domain in d['name']]
-            for name in resolved_names_mutated:
-                print (f"{name}")
+    enumerator = Enumerator(config, profiler=profiler)
 
-                if len(resolved_results) < 1:
-                    continue
+    if args.monitor:
+        from lib.monitor import Monitor
 
-        output_filepath = os.path.join(args.output_dir, f"raw_{root_domain}.csv")
-        with open(output_filepath, 'w', encoding='utf8', newline='') as output_file:
-            fc = csv.DictWriter(output_file, fieldnames=resolved_results[0].keys())
-            fc.writeheader()
-            fc.writerows(resolved_results)
+        monitor = Monitor(
+            resolver=enumerator.resolver,
+            types=types,
+            diff_path=os.path.join(args.output_dir, 'monitor_diff.jsonl'),
+            batch_size=args.monitor_batch,
+            min_interval=args.monitor_min_interval,
+            max_interval=args.monitor_max_interval,
+            max_misses=args.monitor_max_misses)
 
-            print (f"(+)Results saved to raw_{root_domain}.csv")
+        count = monitor.load_results(args.output_dir)
+        print (f"(*) Monitoring {count} names, changes go to monitor_diff.jsonl")
+        monitor.run(cycles=args.monitor_cycles)
+        return
 
-        if args.enrich:
-            print (f"(*) Doing enrichment...")
+    if args.brute:
+        print (f"(*) {len(enumerator.words)} subdomains have been loaded")
 
-            enricher = IPEnricher()
-            enriched_records = []
+    print (f"(*) We\'re going to check the following root domains: {','.join(root_domains)}")
 
-            for result in resolved_results:
-                
-                additional_data = enricher.get_ip_data(result['data'])
-                enriched_record = {**result, **additional_data}
-                enriched_records.append(enriched_record)
-                print (enriched_record)
+    stage_titles = {
+        'amass': f"(*) Running Amass. Timeout is set to {args.amass_timeout}",
+        'brute': "(*) Running bruteforce...",
+        'altmutations': "(*) Resolving altmutations...",
+        'enrich': "(*) Doing enrichment...",
+        'ptr': "(*) Running PTR sweep of the enriched routes..."
+    }
 
+    started_at = time.time()
 
-            resolved_results = enriched_records
+    #results are routed to the root domain owning them, keyed by (name, type, data)
+    raw_by_root = {}
+    enriched_by_root = {}
 
-        output_filepath = os.path.join(args.output_dir, f"enriched_{root_domain}.csv")
-        with open(output_filepath, 'w', encoding='utf8', newline='') as output_file:
-            fc = csv.DictWriter(output_file, fieldnames=resolved_results[0].keys())
-            fc.writeheader()
-            fc.writerows(resolved_results)
+    #closing the enumerator on the way out stops queued and running amass after Ctrl-C or an error
+    with enumerator:
+        if args.amass:
+            #amass runs of all root domains go in the background, each root waits for its own
+            print (f"(*) Starting Amass for {len(root_domains)} root domains, {args.amass_workers} at a time")
+            enumerator.start_amass(root_domains)
+
+        #with amass, a root goes on with the other stages as soon as its own run is done
+        for root_domain in (enumerator.amass_completed() if args.amass else root_domains):
+            stage_counts = {}
+            current_stage = None
+            changed_roots = set()
+
+            for stage, record in enumerator.run(root_domain):
+                if stage != current_stage:
+                    print (stage_titles[stage])
+                    current_stage = stage
+
+                stage_counts[stage] = stage_counts.get(stage, 0) + 1
+                print (record)
+
+                #out-of-scope names (CNAME targets) stay with the domain they were found for
+                owner = enumerator.scope.owner(record['name']) or root_domain
+                results = enriched_by_root if stage == 'enrich' else raw_by_root
+                results.setdefault(owner, {})[(record['name'], record['type'], record['data'])] = record
+                changed_roots.add(owner)
+
+            for stage, count in stage_counts.items():
+                print (f"(+) {stage}: {count} records ({'+'.join(types)})")
+
+            if not changed_roots:
+                print (f"(-) Nothing was found for {root_domain}")
+                continue
+
+            for root in sorted(changed_roots):
+                resolved_results = list(raw_by_root.get(root, {}).values())
+                if resolved_results:
+                    save_results(os.path.join(args.output_dir, f"raw_{root}.csv"), resolved_results)
+                    print (f"(+)Results saved to raw_{root}.csv")
+
+                enriched_results = list(enriched_by_root.get(root, {}).values()) if args.enrich else resolved_results
+                if enriched_results:
+                    save_results(os.path.join(args.output_dir, f"enriched_{root}.csv"), enriched_results)
+                    print (f"(+) Enriched results saved to enriched_{root}.csv")
 
-            print (f"(+) Enriched results saved to enriched_{root_domain}.csv")
+        if args.amass:
+            finished, failed, elapsed = enumerator.amass_report()
+            print (f"(+) Amass: {finished} runs, {failed} failed, {elapsed:.1f}s of amass time in {time.time() - started_at:.1f}s")
+
+    if not args.no_history and (raw_by_root or enriched_by_root):
+        from lib.history import HistoryStore
+
+        history = HistoryStore(args.history_db or os.path.join(results_directory_path, 'history.db'))
+        for root in sorted(set(raw_by_root) | set(enriched_by_root)):
+            records = enriched_by_root.get(root) or raw_by_root.get(root, {})
+            files = [os.path.join(args.output_dir, f"{kind}_{root}.csv") for kind in ('raw', 'enriched')]
+            history.ingest(root, records.values(), started_at=started_at, files=[path for path in files if os.path.exists(path)])
+        history.close()
+        print (f"(+) Results ingested into {history.path}")
+
+    if profiler:
+        profiler.close()
+        print (f"(+) Profiles saved to {args.output_dir}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
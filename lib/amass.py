@@ -1,49 +1,154 @@
+import logging
 import os
+import time
 import uuid
+import shutil
 import subprocess
 import json
 import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-def _exec_and_readlines(cmd):
-    print (cmd)
-    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, stdin=subprocess.PIPE)
-    stdout, stderr = proc.communicate()
+log = logging.getLogger(__name__)
 
-    return [j for j in stdout.splitlines() if j != b'\n']
+class AmassError(Exception):
+    pass
 
-def run_amass(domain, config_path, temp_dir='/tmp', timeout=60):
+class AmassRun:
+    """Outcome of the amass run of one root domain."""
 
-    filename = str(uuid.uuid4())
-    temp_path = os.path.join(temp_dir,'{0}.json'.format(filename))
-    #temp_path = '{0}.json'.format(filename)
+    def __init__(self, domain, results=None, elapsed=0.0, error=None):
+        self.domain = domain
+        self.results = results or []
+        self.elapsed = elapsed
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __str__(self):
+        if self.ok:
+            return f"(+) Amass {self.domain}: {len(self.results)} names in {self.elapsed:.1f}s"
+
+        return f"(-) Amass {self.domain} failed after {self.elapsed:.1f}s: {self.error}"
+
+def _exec_and_readlines(cmd, timeout=None, procs=None, cancel=None):
+    if cancel is not None and cancel.is_set():
+        raise AmassError("cancelled")
+
+    log.info(' '.join(cmd))
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.DEVNULL)
+    if procs is not None:
+        procs.add(proc)
+
+    #AmassPool.shutdown() sets cancel before killing the registered processes,
+    #so a process started meanwhile is killed here
+    if cancel is not None and cancel.is_set():
+        proc.kill()
+
+    try:
+        stdout, stderr = proc.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.communicate()
+        raise AmassError(f"{cmd[1]} was killed after {timeout}s")
+    finally:
+        if procs is not None:
+            procs.discard(proc)
+
+    if proc.returncode != 0:
+        message = stderr.decode('utf-8', 'replace').strip().splitlines()
+        raise AmassError(f"{cmd[1]} exited with {proc.returncode}" + (f": {message[-1]}" if message else ''))
+
+    return [j for j in stdout.splitlines() if j.strip()]
+
+def amass_run(domain, config_path, temp_dir='/tmp', timeout=60, procs=None, cancel=None):
+    """Passive amass enumeration of domain in its own output directory, returns an AmassRun."""
+    #every run gets its own graph database, so concurrent runs don't share state
+    output_dir = os.path.join(temp_dir, 'amass_{0}'.format(uuid.uuid4()))
+    os.makedirs(output_dir, exist_ok=True)
 
     run_passive = [
         'amass','enum',
         '-d', domain,
         '-config', config_path,
+        '-dir', output_dir,
         '-timeout', str(timeout),
         '--passive'
     ]
-    print (' '.join(run_passive))
 
     get_domains = [
         'amass','db',
+        '-dir', output_dir,
         '-d', domain,
         '-names'
     ]
-    print (' '.join(get_domains))
 
-    results = []
+    #amass -timeout is in minutes, kill a run which hangs well past it
+    hard_timeout = int(timeout) * 60 + 300
+    started = time.time()
 
     try:
-        _exec_and_readlines(run_passive)
-        domains = _exec_and_readlines(get_domains)
-        print (domains)
-        for subdomain in domains:
-            doc_json = {"name":subdomain.decode('utf-8'),"domain":domain,"addresses":''}
-            results.append(doc_json)
+        _exec_and_readlines(run_passive, timeout=hard_timeout, procs=procs, cancel=cancel)
+        domains = _exec_and_readlines(get_domains, timeout=300, procs=procs, cancel=cancel)
+        results = [{"name":subdomain.decode('utf-8').strip(),"domain":domain,"addresses":''} for subdomain in domains]
+
+        return AmassRun(domain, results=results, elapsed=time.time() - started)
 
     except Exception as err:
-        print (err)
+        return AmassRun(domain, elapsed=time.time() - started, error=err)
+
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+class AmassPool:
+    """Runs amass for many root domains at once, at most `workers` processes at a time.
+
+    Runs are reported as they complete, completed() yields the domains in that
+    order and result() waits for the run of one domain.
+    """
+
+    def __init__(self, config_path, temp_dir='/tmp', timeout=60, workers=4):
+        self.config_path = config_path
+        self.temp_dir = temp_dir
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='amass')
+        self.futures = {}
+        self.procs = set()
+        self.cancel = threading.Event()
+
+    def _run(self, domain):
+        run = amass_run(domain, self.config_path, temp_dir=self.temp_dir, timeout=self.timeout, procs=self.procs, cancel=self.cancel)
+        if run.ok:
+            log.info(str(run))
+        else:
+            log.warning(str(run))
+
+        return run
+
+    def submit(self, domains):
+        for domain in domains:
+            if domain not in self.futures:
+                self.futures[domain] = self.executor.submit(self._run, domain)
+
+    def result(self, domain):
+        self.submit([domain])
+        return self.futures[domain].result()
+
+    def completed(self):
+        """Domains of the submitted runs in the order their runs finish."""
+        domains = {future: domain for domain, future in self.futures.items()}
+        for future in as_completed(domains):
+            yield domains[future]
+
+    def report(self):
+        """(finished, failed, total amass seconds) of the completed runs."""
+        runs = [f.result() for f in self.futures.values() if f.done() and not f.cancelled()]
+        return len(runs), sum(1 for run in runs if not run.ok), sum(run.elapsed for run in runs)
 
-    return results
\ No newline at end of file
+    def shutdown(self):
+        """Cancel queued runs and kill the running amass processes."""
+        self.cancel.set()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        for proc in list(self.procs):
+            proc.kill()
@@ -0,0 +1,70 @@
+ADDRESS_TYPES = ('A', 'AAAA')
+
+
+class CnameGraph:
+    """CNAME edges and address records of resolved names.
+
+    Chains are walked iteratively with cycle detection, so CNAME loops in
+    broken zones don't blow the stack. Targets which were resolved once are
+    remembered in `resolved_targets` and don't have to be queried again.
+    """
+
+    def __init__(self):
+        self.targets = {}
+        self.addresses = {}
+        self.resolved_targets = set()
+
+    def add_cname(self, name, target):
+        self.targets.setdefault(name, set()).add(target)
+
+    def add_address(self, name, rtype, address):
+        self.addresses.setdefault(name, set()).add((rtype, address))
+
+    def add_records(self, records):
+        """Add mass resolver records ({'name','data','type'})."""
+        for record in records:
+            if record['type'] == 'CNAME':
+                self.add_cname(record['name'], record['data'])
+            elif record['type'] in ADDRESS_TYPES:
+                self.add_address(record['name'], record['type'], record['data'])
+
+    def chain(self, name):
+        """Names reachable from `name` through CNAMEs, `name` first. Each name appears once."""
+        seen = [name]
+        seen_set = {name}
+        stack = [name]
+
+        while stack:
+            current = stack.pop()
+            for target in sorted(self.targets.get(current, ())):
+                if target in seen_set:
+                    continue
+
+                seen_set.add(target)
+                seen.append(target)
+                stack.append(target)
+
+        return seen
+
+    def final_addresses(self, name):
+        """(type, address) pairs the CNAME chain of `name` ends with."""
+        addresses = set()
+        for current in self.chain(name):
+            addresses.update(self.addresses.get(current, ()))
+
+        return sorted(addresses)
+
+    def records(self, name):
+        """Mass resolver records for the whole chain of `name`."""
+        records = []
+        for current in self.chain(name):
+            for target in sorted(self.targets.get(current, ())):
+                records.append({'name': current, 'data': target, 'type': 'CNAME'})
+            for rtype, address in sorted(self.addresses.get(current, ())):
+                records.append({'name': current, 'data': address, 'type': rtype})
+
+        return records
+
+    def unresolved(self, targets):
+        """Targets which are neither resolved already nor known to have addresses."""
+        return [t for t in targets if t not in self.resolved_targets and t not in self.addresses]
@@ -0,0 +1,87 @@
+import logging
+
+from lib.dnsgen import generate_tagged
+from lib.hit_stats import iter_budgeted
+
+log = logging.getLogger(__name__)
+
+
+class IterativeDiscovery:
+    """Feed names confirmed by altmutations back as seeds for further rounds.
+
+    Every seed is expanded at most once and every candidate is queried at most
+    once, no matter how many rounds or seeds produce it.
+    """
+
+    def __init__(self, resolver, wordlist, in_scope, depth=1, budget=None, min_yield=0.0, types=['A','CNAME'], excluded=None):
+        self.resolver = resolver
+        self.wordlist = wordlist
+        self.in_scope = in_scope
+        #candidates for which excluded(name) is true are never queried
+        self.excluded = excluded or (lambda name: False)
+        self.depth = depth
+        self.budget = budget
+        self.min_yield = min_yield
+        self.types = types
+
+        self.expanded = set()
+        self.queried = set()
+        self.known = set()
+        self.rounds = []
+
+    def _candidates(self, frontier, order):
+        for domain, permutator in generate_tagged(domains=frontier, wordlist=self.wordlist, order=order):
+            if domain in self.queried or domain in self.known or self.excluded(domain):
+                continue
+
+            self.queried.add(domain)
+            yield domain, permutator
+
+    def iter_run(self, seeds, order=None):
+        """Yields (results, tried_permutators, hit_permutators) for every resolved chunk of every round."""
+        queries = 0
+
+        self.known.update(seeds)
+        frontier = set(seeds)
+
+        for depth in range(1, self.depth + 1):
+            frontier = frontier - self.expanded
+            if not frontier:
+                break
+
+            remaining = None if self.budget is None else self.budget - queries
+            if remaining is not None and remaining <= 0:
+                log.info("(*) Query budget is spent")
+                break
+
+            self.expanded.update(frontier)
+            log.info(f"(*) Round {depth}: expanding {len(frontier)} seeds")
+
+            round_queries = 0
+            round_names = set()
+
+            for results, tried, hits in iter_budgeted(
+                    self.resolver,
+                    self._candidates(frontier, order),
+                    budget=remaining,
+                    min_yield=self.min_yield,
+                    types=self.types):
+
+                round_queries += len(tried)
+                round_names.update(r['name'] for r in results if self.in_scope(r['name']))
+
+                yield results, tried, hits
+
+            new_names = round_names - self.known
+            self.known.update(new_names)
+            queries += round_queries
+
+            round_yield = len(new_names) / round_queries if round_queries else 0.0
+            self.rounds.append({'round': depth, 'seeds': len(frontier), 'queries': round_queries, 'new': len(new_names), 'yield': round_yield})
+            log.info(f"(+) Round {depth}: {round_queries} queries, {len(new_names)} new names (yield {round_yield:.4f})")
+
+            if round_yield < self.min_yield:
+                log.info(f"(*) Round yield dropped below {self.min_yield}, stopping")
+                break
+
+            frontier = new_names
@@ -4,11 +4,38 @@ import itertools
 import pathlib
 import re
 
-import tldextract
+from lib.wordlist import load_words
 
 WORDS = None
 NUM_COUNT = 3
 
+# Public suffix data is never downloaded: a snapshot put into dicts/ wins,
+# otherwise the snapshot bundled with tldextract is used
+SUFFIX_LIST_PATH = pathlib.Path(__file__).parent.parent / 'dicts' / 'public_suffix_list.dat'
+SUFFIX_CACHE_DIR = pathlib.Path(__file__).parent.parent / 'temp' / 'tldextract'
+EXTRACTOR = None
+
+def get_extractor():
+	'''
+	Create the offline tldextract extractor on first use
+	'''
+
+	global EXTRACTOR
+
+	if EXTRACTOR is None:
+		import tldextract
+
+		suffix_list_urls = ()
+		if SUFFIX_LIST_PATH.exists():
+			suffix_list_urls = (SUFFIX_LIST_PATH.as_uri(),)
+
+		EXTRACTOR = tldextract.TLDExtract(
+			cache_dir=str(SUFFIX_CACHE_DIR),
+			suffix_list_urls=suffix_list_urls,
+			fallback_to_snapshot=True)
+
+	return EXTRACTOR
+
 def create_registrar():
 	'''
 	Create function registration decorator
@@ -38,7 +65,7 @@ def partiate_domain(domain):
 	# test.2.foo.example.com.cn -> [test, 2, foo, example.com.cn]
 	# test.example.co.uk -> [test, example.co.uk]
 
-	ext = tldextract.extract(domain.lower())
+	ext = get_extractor()(domain.lower())
 	parts = (ext.subdomain.split('.') + [ext.registered_domain])
 
 	return parts
@@ -216,23 +243,43 @@ def init_words(domains, wordlist, wordlen, fast):
 	if wordlist is None:
 		wordlist = pathlib.Path(__file__).parent / 'words.txt'
 	
-	WORDS = open(wordlist).read().splitlines()
+	WORDS = load_words(wordlist)
 	if fast:
 		WORDS = WORDS[:10]
 	
 	WORDS = list(set(WORDS).union(extract_custom_words(domains, wordlen)))
 
-def generate(domains, wordlist=None, wordlen=5, fast=False, skip_init=False):
+def permutator_names(fast=False):
 	'''
-	Generate permutations from provided domains
+	Names of the permutators used by generate()
+	'''
+
+	return [perm.__name__ for perm in (FAST_PERMUTATOR.members if fast else PERMUTATOR.members)]
+
+def generate_tagged(domains, wordlist=None, wordlen=5, fast=False, skip_init=False, order=None):
+	'''
+	Generate (permutation, permutator name) pairs from provided domains.
+	`order` is an optional list of permutator names to run, in that order.
 	'''
 
 	if not skip_init:
 		init_words(domains, wordlist, wordlen, fast)
 
-	for domain in set(domains):
-		parts = partiate_domain(domain)
+	permutators = {perm.__name__: perm for perm in (FAST_PERMUTATOR.members if fast else PERMUTATOR.members)}
+	if order is None:
+		order = list(permutators)
+
+	parts_list = [partiate_domain(domain) for domain in set(domains)]
+
+	for name in order:
+		for parts in parts_list:
+			for possible_domain in permutators[name](parts):
+				yield possible_domain, name
+
+def generate(domains, wordlist=None, wordlen=5, fast=False, skip_init=False):
+	'''
+	Generate permutations from provided domains
+	'''
 
-		for perm in (FAST_PERMUTATOR.members if fast else PERMUTATOR.members):
-			for possible_domain in perm(parts):
-				yield possible_domain
+	for possible_domain, _ in generate_tagged(domains, wordlist, wordlen, fast, skip_init):
+		yield possible_domain
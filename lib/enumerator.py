@@ -0,0 +1,373 @@
+import os
+import threading
+
+from lib.mass_resolver import MassDnsResolver
+from lib.records import DEFAULT_TYPES, RecordStore
+from lib.hit_stats import HitStats, iter_budgeted
+from lib.wordlist import open_words, prefer_compiled
+from lib.scope import ScopeTrie
+
+BASE_DIR = os.path.normpath(os.path.join(os.path.realpath(os.path.dirname(__file__)), '..'))
+
+
+class EnumeratorConfig:
+    """Settings of an enumeration run, the library counterpart of the dns_enum.py options."""
+
+    def __init__(self,
+            amass=False,
+            brute=False,
+            altmutations=False,
+            enrich=False,
+            ptr_sweep=False,
+            ptr_max_prefix=24,
+            ptr_max_prefix_v6=120,
+            types=None,
+            root_domains=(),
+            exclude=(),
+            wordlist=os.path.join(BASE_DIR, 'dicts', 'n0kovo_subdomains_small.txt'),
+            alt_wordlist=os.path.join(BASE_DIR, 'dicts', 'altmutations.txt'),
+            alt_depth=1,
+            amass_timeout=120,
+            amass_workers=4,
+            budget=None,
+            min_yield=0.0,
+            threads=1000,
+            adaptive_rate=False,
+            min_threads=50,
+            max_threads=10000,
+            max_failure_rate=0.05,
+            rate_log_path=None,
+            trusted_resolvers_path=os.path.join(BASE_DIR, 'dicts', 'trusted_resolvers.txt'),
+            mass_resolvers_path=os.path.join(BASE_DIR, 'dicts', 'mass_resolvers.txt'),
+            temp_directory_path=os.path.join(BASE_DIR, 'temp'),
+            amass_config_path=os.path.join(BASE_DIR, '3rdparty', 'amass', 'config.yaml'),
+            stats_path=os.path.join(BASE_DIR, 'stats', 'hit_stats.json')):
+
+        self.amass = amass
+        self.brute = brute
+        self.altmutations = altmutations
+        self.enrich = enrich
+        self.ptr_sweep = ptr_sweep
+        self.ptr_max_prefix = ptr_max_prefix
+        self.ptr_max_prefix_v6 = ptr_max_prefix_v6
+        self.types = types or list(DEFAULT_TYPES)
+        self.root_domains = list(root_domains)
+        self.exclude = list(exclude)
+        self.wordlist = wordlist
+        self.alt_wordlist = alt_wordlist
+        self.alt_depth = alt_depth
+        self.amass_timeout = amass_timeout
+        self.amass_workers = amass_workers
+        self.budget = budget
+        self.min_yield = min_yield
+        self.threads = threads
+        self.adaptive_rate = adaptive_rate
+        self.min_threads = min_threads
+        self.max_threads = max_threads
+        self.max_failure_rate = max_failure_rate
+        self.rate_log_path = rate_log_path
+        self.trusted_resolvers_path = trusted_resolvers_path
+        self.mass_resolvers_path = mass_resolvers_path
+        self.temp_directory_path = temp_directory_path
+        self.amass_config_path = amass_config_path
+        self.stats_path = stats_path
+
+    @property
+    def budgeted(self):
+        return self.budget is not None or self.min_yield > 0
+
+
+class _Failure:
+    def __init__(self, error):
+        self.error = error
+
+
+class Enumerator:
+    """Streaming enumeration pipeline.
+
+    Every stage is a generator of resolver records ({'name','data','type'}) which
+    does its work lazily, one resolver chunk at a time, so a slow consumer
+    holds the pipeline back instead of letting results pile up. run() chains
+    the enabled stages for a root domain, arun() is its asyncio counterpart.
+
+    Stages report progress through the lib.* loggers and print nothing themselves.
+    """
+
+    def __init__(self, config=None, resolver=None, profiler=None):
+        self.config = config or EnumeratorConfig()
+        #optional StageProfiler wrapped around every stage
+        self.profiler = profiler
+        self.scope = ScopeTrie(roots=self.config.root_domains, excludes=self.config.exclude)
+        self.resolver = resolver or self._build_resolver()
+        self.resolver.scope = self.scope
+        self.stats = HitStats(self.config.stats_path)
+        self.amass_names = {}
+        self._amass_pool = None
+        self._words = None
+
+    def _build_resolver(self):
+        config = self.config
+
+        rate_controller = None
+        if config.adaptive_rate:
+            from lib.rate_control import AimdController
+
+            rate_controller = AimdController(
+                initial=config.threads,
+                minimum=config.min_threads,
+                maximum=config.max_threads,
+                max_failure_rate=config.max_failure_rate,
+                log_path=config.rate_log_path)
+
+        return MassDnsResolver(
+            trusted_resolvers_path=config.trusted_resolvers_path,
+            mass_resolvers_path=config.mass_resolvers_path,
+            temp_directory_path=config.temp_directory_path,
+            threads=config.threads,
+            rate_controller=rate_controller,
+            #smaller chunks give the rate controller more feedback windows
+            chunk_size=2000 if rate_controller else 10000)
+
+    @property
+    def words(self):
+        if self._words is None:
+            self._words = open_words(prefer_compiled(self.config.wordlist))
+
+        return self._words
+
+    def in_scope(self, name, root_domain):
+        return self.scope.owner(name) == root_domain
+
+    def start_amass(self, root_domains):
+        """Start amass for root_domains in the background, config.amass_workers processes at a time.
+
+        amass() of a started root domain waits for its run instead of starting one.
+        """
+        from lib.amass import AmassPool
+
+        if self._amass_pool is None:
+            self._amass_pool = AmassPool(
+                config_path=self.config.amass_config_path,
+                temp_dir=self.config.temp_directory_path,
+                timeout=self.config.amass_timeout,
+                workers=self.config.amass_workers)
+
+        self._amass_pool.submit(root_domains)
+
+    def amass_completed(self):
+        """Root domains passed to start_amass(), in the order their amass runs finish."""
+        if self._amass_pool:
+            yield from self._amass_pool.completed()
+
+    def amass_report(self):
+        """(finished, failed, total amass seconds) of the started amass runs."""
+        return self._amass_pool.report() if self._amass_pool else (0, 0, 0.0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Cancel pending amass runs, kill the running ones and release the wordlist."""
+        if self._amass_pool:
+            self._amass_pool.shutdown()
+            self._amass_pool = None
+
+        if hasattr(self._words, 'close'):
+            self._words.close()
+        self._words = None
+
+    def amass(self, root_domain):
+        """Passive amass names of root_domain, resolved with the trusted resolvers."""
+        if self._amass_pool is None:
+            self.start_amass([root_domain])
+
+        amass_domains = self._amass_pool.result(root_domain).results
+
+        names = list(set(domain['name'] for domain in amass_domains if domain['name'] in self.scope))
+        self.amass_names[root_domain] = names
+
+        yield from self.resolver.trusted_resolve(domains=names, types=self.config.types)
+
+    def brute(self, root_domain):
+        """Wordlist brute force, highest-yield labels first in budgeted mode."""
+        config = self.config
+
+        labels = self.stats.order('labels', self.words) if config.budgeted else self.words
+        candidates = ((f"{label}.{root_domain}", label) for label in labels)
+        candidates = ((name, label) for name, label in candidates if not self.scope.excluded(name))
+
+        try:
+            for results, tried, hits in iter_budgeted(self.resolver, candidates, budget=config.budget, min_yield=config.min_yield, chunk_size=10000, types=config.types):
+                self.stats.record('labels', tried, hits)
+                yield from results
+        finally:
+            self.stats.save()
+
+    def altmutations(self, root_domain, seeds):
+        """dnsgen permutations of seeds, iterated up to config.alt_depth rounds."""
+        from lib.dnsgen import permutator_names
+        from lib.discovery import IterativeDiscovery
+
+        config = self.config
+        order = self.stats.order('permutators', permutator_names()) if config.budgeted else None
+
+        discovery = IterativeDiscovery(
+            resolver=self.resolver,
+            wordlist=prefer_compiled(config.alt_wordlist),
+            in_scope=lambda name: self.in_scope(name, root_domain),
+            depth=config.alt_depth,
+            budget=config.budget,
+            min_yield=config.min_yield,
+            types=config.types,
+            excluded=self.scope.excluded)
+
+        try:
+            for results, tried, hits in discovery.iter_run(seeds=seeds, order=order):
+                self.stats.record('permutators', tried, hits)
+                yield from results
+        finally:
+            self.stats.save()
+
+    def enrich(self, records):
+        """Records extended with Final/ISP/ORG/AS/Route.
+
+        CNAMEs get the addresses their chain ends with in 'Final' and the data of the first one.
+        """
+        from lib.ip_enrichment import IPEnricher
+        from lib.cname_graph import CnameGraph
+
+        records = list(records)
+        enricher = IPEnricher()
+        cname_graph = CnameGraph()
+        cname_graph.add_records(records)
+
+        for result in records:
+            address = result['data']
+            final = []
+            if result['type'] == 'CNAME':
+                final = [final_address for _, final_address in cname_graph.final_addresses(result['name'])]
+                address = final[0] if final else ''
+
+            yield {**result, 'Final': ' '.join(final), **enricher.get_ip_data(address)}
+
+    def ptr_sweep(self, routes):
+        """Forward records of in-scope names found by reverse DNS of every address in `routes`."""
+        from lib.ptr_sweep import PtrSweep
+
+        sweep = PtrSweep(
+            resolver=self.resolver,
+            scope=self.scope,
+            types=self.config.types,
+            max_prefix=self.config.ptr_max_prefix,
+            max_prefix_v6=self.config.ptr_max_prefix_v6)
+
+        yield from sweep.sweep(routes)
+
+    def _profiled(self, stage, root_domain, records):
+        if self.profiler:
+            return self.profiler.wrap(f"{stage}_{root_domain}", records)
+
+        return records
+
+    def run(self, root_domain):
+        """Yields deduplicated (stage, record) pairs of every enabled stage.
+
+        Stages are 'amass', 'brute', 'altmutations' and, after all of them,
+        'enrich' with the enriched version of every record. With ptr_sweep,
+        'ptr' records found in the enriched routes follow, then their 'enrich'.
+        """
+        config = self.config
+        store = RecordStore()
+
+        if self.scope.owner(root_domain) != root_domain:
+            self.scope.add(root_domain)
+
+        def emit(stage, records, label=None):
+            for record in self._profiled(label or stage, root_domain, records):
+                #names outside every root (CNAME targets) are kept, excluded subtrees are not
+                if self.scope.excluded(record['name']):
+                    continue
+
+                if store.add(record):
+                    yield stage, record
+
+        if config.amass:
+            yield from emit('amass', self.amass(root_domain))
+
+        if config.brute:
+            yield from emit('brute', self.brute(root_domain))
+
+        if config.altmutations:
+            seeds = [name for name in store.names() if self.in_scope(name, root_domain)]
+            yield from emit('altmutations', self.altmutations(root_domain, seeds))
+
+        #additionally add amass results which were not resolved
+        if config.amass:
+            resolved_names = set(store.names())
+            unresolved = [{'name': name, 'data': '', 'type': 'A'} for name in self.amass_names.get(root_domain, []) if name not in resolved_names]
+            yield from emit('amass', unresolved, label='amass_unresolved')
+
+        if config.enrich:
+            routes = set()
+            for record in self._profiled('enrich', root_domain, self.enrich(store)):
+                #CNAME rows carry the route of their target (a CDN), which isn't ours to sweep
+                if record['type'] in ('A', 'AAAA') and record.get('Route') and self.in_scope(record['name'], root_domain):
+                    routes.add(record['Route'])
+
+                yield 'enrich', record
+
+            if config.ptr_sweep and routes:
+                found = []
+                for stage, record in emit('ptr', self.ptr_sweep(routes)):
+                    found.append(record)
+                    yield stage, record
+
+                for record in self._profiled('enrich_ptr', root_domain, self.enrich(found)):
+                    yield 'enrich', record
+
+    async def arun(self, root_domain, maxsize=1000):
+        """Async iterator over run(). The pipeline runs in a worker thread and
+        is paused whenever `maxsize` items wait for the consumer."""
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize)
+        stop = threading.Event()
+        done = object()
+
+        def put(item):
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+        def produce():
+            try:
+                for item in self.run(root_domain):
+                    if stop.is_set():
+                        return
+                    put(item)
+            except Exception as err:
+                put(_Failure(err))
+            finally:
+                if not stop.is_set():
+                    put(done)
+
+        producer = loop.run_in_executor(None, produce)
+
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, _Failure):
+                    raise item.error
+
+                yield item
+        finally:
+            stop.set()
+            #unblock a producer waiting for free space
+            while not producer.done():
+                while not queue.empty():
+                    queue.get_nowait()
+                await asyncio.sleep(0.01)
@@ -0,0 +1,278 @@
+import os
+import re
+import sys
+import csv
+import time
+import hashlib
+import sqlite3
+import argparse
+from pathlib import Path
+
+BASE_DIR = os.path.normpath(os.path.join(os.path.realpath(os.path.dirname(__file__)), '..'))
+HISTORY_PATH = os.path.join(BASE_DIR, 'results', 'history.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started_at REAL NOT NULL,
+    root_domain TEXT NOT NULL,
+    source TEXT
+);
+CREATE TABLE IF NOT EXISTS records (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    name TEXT NOT NULL,
+    type TEXT NOT NULL,
+    data TEXT NOT NULL,
+    asn TEXT,
+    as_name TEXT,
+    org TEXT,
+    isp TEXT,
+    route TEXT
+);
+CREATE TABLE IF NOT EXISTS addresses (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    name TEXT NOT NULL,
+    type TEXT NOT NULL,
+    address TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS names (
+    name TEXT PRIMARY KEY,
+    root_domain TEXT,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS files (
+    sha1 TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    run_id INTEGER NOT NULL REFERENCES runs(id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS runs_started_at ON runs(started_at);
+CREATE INDEX IF NOT EXISTS runs_root_domain ON runs(root_domain, started_at);
+CREATE INDEX IF NOT EXISTS records_run ON records(run_id);
+CREATE INDEX IF NOT EXISTS records_name ON records(name);
+CREATE INDEX IF NOT EXISTS records_data ON records(data);
+CREATE INDEX IF NOT EXISTS records_asn ON records(asn);
+CREATE INDEX IF NOT EXISTS addresses_address ON addresses(address);
+CREATE INDEX IF NOT EXISTS names_first_seen ON names(first_seen);
+"""
+
+CSV_RE = re.compile(r'^(raw|enriched)_(.+)\.csv$')
+
+
+def normalize_asn(value):
+    """'AS15169 Google LLC', 'as15169' and '15169' all become 'AS15169'."""
+    if not value:
+        return ''
+
+    token = value.strip().split()[0].upper() if value.strip() else ''
+    if token.isdigit():
+        token = 'AS' + token
+
+    return token if re.match(r'^AS\d+$', token) else ''
+
+def file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+class HistoryStore:
+    """SQLite store of every run's results, indexed by name, address/data, ASN and run time."""
+
+    def __init__(self, path=HISTORY_PATH):
+        self.path = path
+        Path(os.path.dirname(path) or '.').mkdir(parents=True, exist_ok=True)
+
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def ingest(self, root_domain, records, started_at=None, source='dns_enum', files=()):
+        """Store one run of root_domain. Records may be raw or enriched. Returns the run id.
+
+        `files` are result files holding this run, ingest_csv() skips them later.
+        """
+        started_at = time.time() if started_at is None else started_at
+
+        with self.db:
+            run_id = self.db.execute(
+                "INSERT INTO runs (started_at, root_domain, source) VALUES (?, ?, ?)",
+                (started_at, root_domain, source)).lastrowid
+
+            rows = []
+            finals = []
+            names = set()
+            for record in records:
+                #addresses a CNAME chain ends with, from the enrichment
+                for address in (record.get('Final') or '').split():
+                    finals.append((run_id, record['name'], record['type'], address))
+
+                rows.append((
+                    run_id,
+                    record['name'],
+                    record['type'],
+                    record.get('data') or '',
+                    normalize_asn(record.get('AS')),
+                    record.get('AS') or None,
+                    record.get('ORG') or None,
+                    record.get('ISP') or None,
+                    record.get('Route') or None))
+                names.add(record['name'])
+
+            self.db.executemany(
+                "INSERT INTO records (run_id, name, type, data, asn, as_name, org, isp, route) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows)
+
+            self.db.executemany(
+                "INSERT INTO addresses (run_id, name, type, address) VALUES (?, ?, ?, ?)",
+                finals)
+
+            self.db.executemany(
+                """INSERT INTO names (name, root_domain, first_seen, last_seen) VALUES (?, ?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET
+                    first_seen = min(first_seen, excluded.first_seen),
+                    last_seen = max(last_seen, excluded.last_seen)""",
+                [(name, root_domain, started_at, started_at) for name in names])
+
+            self.db.executemany(
+                "INSERT OR REPLACE INTO files (sha1, path, run_id) VALUES (?, ?, ?)",
+                [(file_hash(path), os.path.abspath(path), run_id) for path in files])
+
+        return run_id
+
+    def ingested(self, path):
+        """Run id the content of the file at `path` was ingested as, None if it wasn't."""
+        row = self.db.execute("SELECT run_id FROM files WHERE sha1 = ?", (file_hash(path),)).fetchone()
+        return row[0] if row else None
+
+    def ingest_csv(self, path, started_at=None):
+        """Ingest a raw_<domain>.csv or enriched_<domain>.csv file, timed by its mtime by default.
+
+        A file whose content was ingested before isn't ingested again, its run id is returned.
+        """
+        m = CSV_RE.match(os.path.basename(path))
+        if not m:
+            raise ValueError(f"{path} is not a raw_<domain>.csv or enriched_<domain>.csv file")
+
+        run_id = self.ingested(path)
+        if run_id is not None:
+            return run_id
+
+        with open(path, encoding='utf8') as f:
+            records = list(csv.DictReader(f))
+
+        if started_at is None:
+            started_at = os.path.getmtime(path)
+
+        return self.ingest(m.group(2), records, started_at=started_at, source=os.path.basename(path), files=[path])
+
+    def names_for_data(self, data):
+        """Names which pointed to an address (or any record data), with first and last time seen.
+
+        CNAMEs whose chain ended with the address are included with type CNAME.
+        """
+        return self.db.execute(
+            """SELECT m.name, m.type, min(runs.started_at), max(runs.started_at)
+            FROM (
+                SELECT name, type, run_id FROM records WHERE data = ?
+                UNION ALL
+                SELECT name, type, run_id FROM addresses WHERE address = ?
+            ) m JOIN runs ON runs.id = m.run_id
+            GROUP BY m.name, m.type ORDER BY m.name""", (data, data)).fetchall()
+
+    def names_for_asn(self, asn):
+        """Names and addresses in an ASN, with first and last time seen."""
+        return self.db.execute(
+            """SELECT r.name, r.data, min(runs.started_at), max(runs.started_at)
+            FROM records r JOIN runs ON runs.id = r.run_id
+            WHERE r.asn = ?
+            GROUP BY r.name, r.data ORDER BY r.name""", (normalize_asn(asn),)).fetchall()
+
+    def name_history(self, name):
+        """(first_seen, last_seen) of a name and its records per run, oldest first."""
+        seen = self.db.execute("SELECT first_seen, last_seen FROM names WHERE name = ?", (name,)).fetchone()
+        records = self.db.execute(
+            """SELECT runs.started_at, r.type, r.data, r.asn
+            FROM records r JOIN runs ON runs.id = r.run_id
+            WHERE r.name = ? ORDER BY runs.started_at""", (name,)).fetchall()
+
+        return seen, records
+
+    def new_names(self, since, root_domain=None):
+        """Names first seen after `since`."""
+        query = "SELECT name, root_domain, first_seen FROM names WHERE first_seen >= ?"
+        params = [since]
+        if root_domain:
+            query += " AND root_domain = ?"
+            params.append(root_domain)
+
+        return self.db.execute(query + " ORDER BY first_seen", params).fetchall()
+
+
+def format_time(ts):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ts))
+
+def parser_error(errmsg):
+    print("Usage: python " + sys.argv[0] + " [Options] use -h for help")
+    print("Error: " + errmsg)
+    sys.exit()
+
+def parse_args():
+    # parse the arguments
+    parser = argparse.ArgumentParser(epilog='\tExample: \r\npython3 -m lib.history --ip 1.2.3.4')
+    parser.error = parser_error
+    parser._optionals.title = "OPTIONS"
+    parser.add_argument('--db', help="history database", default=HISTORY_PATH)
+    parser.add_argument('--ingest', help="raw_*.csv / enriched_*.csv files to ingest", nargs='+')
+    parser.add_argument('--ip', help="names which pointed to this address (or any record data)")
+    parser.add_argument('--asn', help="names with addresses in this ASN")
+    parser.add_argument('--name', help="first/last seen and records of a name")
+    parser.add_argument('--new-since', help="names first seen in the last N days", type=float)
+    parser.add_argument('-d', '--domain', help="limit --new-since to a root domain")
+
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    store = HistoryStore(args.db)
+
+    if args.ingest:
+        for path in args.ingest:
+            run_id = store.ingested(path)
+            if run_id is not None:
+                print ("(*) {0} was already ingested as run {1}, skipped".format(path, run_id))
+                continue
+
+            run_id = store.ingest_csv(path)
+            print ("(+) {0} ingested as run {1}".format(path, run_id))
+
+    if args.ip:
+        for name, rtype, first_seen, last_seen in store.names_for_data(args.ip):
+            print ("{0},{1},{2},{3}".format(name, rtype, format_time(first_seen), format_time(last_seen)))
+
+    if args.asn:
+        for name, data, first_seen, last_seen in store.names_for_asn(args.asn):
+            print ("{0},{1},{2},{3}".format(name, data, format_time(first_seen), format_time(last_seen)))
+
+    if args.name:
+        seen, records = store.name_history(args.name)
+        if seen is None:
+            print ("(-) {0} was never seen".format(args.name))
+        else:
+            print ("(+) first seen {0}, last seen {1}".format(format_time(seen[0]), format_time(seen[1])))
+            for started_at, rtype, data, asn in records:
+                print ("{0},{1},{2},{3}".format(format_time(started_at), rtype, data, asn or ''))
+
+    if args.new_since is not None:
+        for name, root_domain, first_seen in store.new_names(time.time() - args.new_since * 86400, args.domain):
+            print ("{0},{1},{2}".format(name, root_domain, format_time(first_seen)))
+
+    store.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+import logging
+import os
+import json
+import itertools
+from collections import Counter
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+
+class HitStats:
+    """Local store of how often brute force labels and dnsgen permutators actually resolved.
+
+    Stats are kept per kind ('labels', 'permutators') as key -> [tried, hits].
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.data = {'labels': {}, 'permutators': {}}
+
+        if os.path.exists(path):
+            with open(path) as f:
+                self.data.update(json.load(f))
+
+    def record(self, kind, tried, hits):
+        """Account every occurrence in `tried` as one query and every occurrence in `hits` as one hit."""
+        stats = self.data.setdefault(kind, {})
+
+        for key, count in Counter(tried).items():
+            stats.setdefault(key, [0, 0])[0] += count
+
+        for key, count in Counter(hits).items():
+            stats.setdefault(key, [0, 0])[1] += count
+
+    def _prior(self, kind):
+        stats = self.data.get(kind, {})
+        tried = sum(s[0] for s in stats.values())
+        hits = sum(s[1] for s in stats.values())
+
+        return hits / tried if tried else 0.0
+
+    def score(self, kind, key, prior=None):
+        """Smoothed hit rate. Unknown keys get the global hit rate of their kind."""
+        if prior is None:
+            prior = self._prior(kind)
+
+        tried, hits = self.data.get(kind, {}).get(key, [0, 0])
+        return (hits + prior) / (tried + 1)
+
+    def order(self, kind, keys):
+        """Return keys ordered by descending yield, keeping the original order for ties."""
+        prior = self._prior(kind)
+        return sorted(keys, key=lambda k: -self.score(kind, k, prior=prior))
+
+    def save(self):
+        Path(os.path.dirname(self.path) or '.').mkdir(parents=True, exist_ok=True)
+
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.data, f)
+
+        os.replace(tmp_path, self.path)
+
+
+def iter_budgeted(resolver, candidates, budget=None, min_yield=0.0, chunk_size=5000, types=['A','CNAME']):
+    """Resolve (domain, key) candidates in order, chunk by chunk.
+
+    `candidates` may be any iterable, it's consumed lazily one chunk at a time.
+    Stops once `budget` domains have been queried or a chunk yields less than
+    `min_yield` resolved domains per query. Yields (results, tried_keys, hit_keys)
+    for every chunk.
+    """
+
+    queried = 0
+    candidates = iter(candidates)
+
+    while True:
+        size = chunk_size
+        if budget is not None:
+            size = min(size, budget - queried)
+
+        chunk = list(itertools.islice(candidates, max(size, 0)))
+        if not chunk:
+            break
+
+        keys_by_domain = {}
+        for domain, key in chunk:
+            keys_by_domain.setdefault(domain, key)
+
+        chunk_results = resolver.mass_resolve(domains=list(keys_by_domain), types=types, recheck=True)
+        queried += len(chunk)
+
+        found = set(r['name'] for r in chunk_results if r['name'] in keys_by_domain)
+
+        yield chunk_results, [key for _, key in chunk], [keys_by_domain[name] for name in found]
+
+        chunk_yield = len(found) / len(chunk)
+        log.info(f"(*) {queried} queried, {len(found)} found in the last chunk (yield {chunk_yield:.4f})")
+
+        if chunk_yield < min_yield:
+            log.info(f"(*) Yield dropped below {min_yield}, stopping")
+            break
@@ -1,17 +1,17 @@
 
-import urllib3
-urllib3.disable_warnings()
-
+import os
 import time
-import requests
 import ipaddress
 import socket
 import sys
 import argparse
 import csv
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
 
 import dns.resolver
 
+from lib.cname_graph import CnameGraph
+
 class IPEnricher():
     def __init__(self, cache={}, delay=1):
         self.cache = cache
@@ -35,6 +35,10 @@ class IPEnricher():
         if ip in self.cache:
             return self.cache[ip]
         
+        import requests
+        import urllib3
+        urllib3.disable_warnings()
+
         time.sleep(self.delay)
         r = requests.get(f"https://ip-db.io/api/{ip}", verify=False)
         data = r.json()
@@ -49,8 +53,15 @@ class IPEnricher():
         return enriched_data
 
 class IPResolver():
-    def __init__(self, cache={}, report_not_resolved=False):
+    def __init__(self, cache={}, report_not_resolved=False, nameservers=None, timeout=None):
         self.report_not_resolved = report_not_resolved
+
+        #use the system configuration unless nameservers are given
+        self.resolver = dns.resolver.Resolver(configure=not nameservers)
+        if nameservers:
+            self.resolver.nameservers = nameservers
+        if timeout:
+            self.resolver.lifetime = timeout
     
     @staticmethod
     def strip_last_dot(addr):
@@ -61,7 +72,7 @@ class IPResolver():
         results = []
 
         try:
-            answers = dns.resolver.resolve(name, rtype)
+            answers = self.resolver.resolve(name, rtype)
         except (dns.exception.Timeout, dns.resolver.NXDOMAIN,
             dns.resolver.YXDOMAIN, dns.resolver.NoAnswer,
             dns.resolver.NoNameservers, dns.name.EmptyLabel, socket.error):
@@ -89,32 +100,58 @@ class IPResolver():
 
         return results
     
-    def resolve(self, name):
-        resolved_results = self._resolve(name, rtype="A")
-        resolved_results += self._resolve(name, rtype="AAAA")
+    def resolve(self, name, types=('A', 'AAAA')):
+        resolved_results = []
+        for rtype in types:
+            resolved_results += self._resolve(name, rtype=rtype)
         return resolved_results
 
 
-def format_str(item):
-    return f"{item['Type']},{item['Name']},{item['Address']},{item['Target']},{item['ISP']},{item['ORG']},{item['AS']},{item['Route']}"
-
-def handle_a_item(item):
-    enriched_item = enrich_ipdb(item, cache=enriched_item_cache)
-    print (format_str(enriched_item))
-
-def handle_cname_item(item, all_items):
-    items = []
+FIELDNAMES = ['Type', 'Name', 'Address', 'Target', 'Final', 'ISP', 'ORG', 'AS', 'Route']
 
-    #print the CNAME item itself
-    enriched_item = enrich_ipdb(item, cache=enriched_item_cache)
-    print (format_str(enriched_item))
-
-    for related_item in all_items:
-        if related_item['Type'] == "A" and related_item['Name'] == enriched_item['Target']:
-            handle_a_item(related_item)
-        
-        elif related_item['Type'] == "CNAME" and related_item['Name'] == enriched_item['Target']:
-            handle_cname_item(item=related_item, all_items=all_items)
+def format_str(item):
+    return f"{item['Type']},{item['Name']},{item['Address']},{item['Target']},{item['Final']},{item['ISP']},{item['ORG']},{item['AS']},{item['Route']}"
+
+def build_cname_graph(items):
+    graph = CnameGraph()
+    for item in items:
+        if item['Type'] == 'CNAME':
+            graph.add_cname(item['Name'], item['Target'])
+        elif item['Address']:
+            graph.add_address(item['Name'], item['Type'], item['Address'])
+
+    return graph
+
+def chain_records(records):
+    """Yield (record, address to enrich) for the resolved records of one name.
+
+    CNAME records get the addresses their chain ends with in 'Final' and are
+    enriched with the first one.
+    """
+    #the chain is repeated in the answer of every queried type
+    records = [dict(t) for t in dict.fromkeys(tuple(record.items()) for record in records)]
+    graph = build_cname_graph(records)
+
+    for record in records:
+        final = []
+        if record['Type'] == 'CNAME':
+            final = [address for _, address in graph.final_addresses(record['Target'])]
+
+        yield {**record, 'Final': ' '.join(final)}, record['Address'] or (final[0] if final else '')
+
+def enrich_safely(enricher, address):
+    """enricher.get_ip_data() which logs a failed lookup and caches its empty result."""
+    try:
+        return enricher.get_ip_data(address)
+    except Exception as err:
+        print (f'[-] Enrichment of {address} failed: {err!r}')
+        enricher.cache[address] = enricher.get_ip_data('')
+        return enricher.cache[address]
+
+def enrich_records(records, enricher):
+    """Enrich the resolved records of one name, see chain_records()."""
+    for record, address in chain_records(records):
+        yield {**record, **enrich_safely(enricher, address)}
 
 def main(args):
     resolver = IPResolver()
@@ -129,12 +166,7 @@ def main(args):
     for domain in domains_to_resolve:
         resolved_records = resolver.resolve(domain)
 
-        #make them uniq
-        #resolved_records = [dict(t) for t in {tuple(d.items()) for d in resolved_records}]
-
-        for record in resolved_records:
-            additional_data = enricher.get_ip_data(record['Address'])
-            enriched_record = {**record, **additional_data}
+        for enriched_record in enrich_records(resolved_records, enricher):
             final_results.append(enriched_record)
 
             print (enriched_record)
@@ -145,6 +177,97 @@ def main(args):
         fc.writerows(final_results)
 
     print (f'[+] Results have been saved to {args.output_file}')
+
+def load_nameservers(value):
+    """Nameservers from a comma separated list or a file with one address per line."""
+    if os.path.isfile(value):
+        with open(value) as f:
+            return [s.strip() for s in f if s.strip()]
+
+    return [s.strip() for s in value.split(',') if s.strip()]
+
+def resolve_safely(resolver, name):
+    """resolver.resolve() which logs unexpected errors (bad names, ...) and returns no records."""
+    try:
+        return resolver.resolve(name)
+    except Exception as err:
+        print (f'[-] Resolution of {name} failed: {err!r}')
+        return []
+
+def resolve_concurrently(resolver, names, threads):
+    """Resolve names in a thread pool, yielding record lists as they complete.
+
+    At most threads*2 names are in flight, so the input is consumed lazily.
+    A failing name yields an empty list instead of stopping the run.
+    """
+    names = iter(names)
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        in_flight = set()
+
+        for name in names:
+            in_flight.add(executor.submit(resolve_safely, resolver, name))
+            if len(in_flight) < threads * 2:
+                continue
+
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+        for future in as_completed(in_flight):
+            yield future.result()
+
+def bulk_main(args):
+    nameservers = load_nameservers(args.nameservers) if args.nameservers else None
+    resolver = IPResolver(nameservers=nameservers, timeout=args.timeout)
+    enricher = IPEnricher()
+
+    with open(args.input_file,'r') as f:
+        #dedup names keeping the input order
+        domains_to_resolve = list(dict.fromkeys(item.strip() for item in f if item.strip()))
+
+    print (f'[*] Resolving {len(domains_to_resolve)} names with {args.threads} threads')
+
+    rows = 0
+    #every address is looked up once, in its own pool, so resolution never waits for ip-db
+    lookups = {}
+    waiting = []
+
+    with open(args.output_file, 'w', encoding='utf8', newline='') as output_file, \
+            ThreadPoolExecutor(max_workers=args.enrich_threads) as enrich_pool:
+        fc = csv.DictWriter(output_file, fieldnames=FIELDNAMES)
+        fc.writeheader()
+
+        def write_ready(block=False):
+            nonlocal rows, waiting
+
+            still_waiting = []
+            for record, address in waiting:
+                lookup = lookups[address]
+                if not block and not lookup.done():
+                    still_waiting.append((record, address))
+                    continue
+
+                enriched_record = {**record, **lookup.result()}
+                fc.writerow(enriched_record)
+                rows += 1
+
+                print (format_str(enriched_record))
+
+            waiting = still_waiting
+            output_file.flush()
+
+        for resolved_records in resolve_concurrently(resolver, domains_to_resolve, args.threads):
+            for record, address in chain_records(resolved_records):
+                if address not in lookups:
+                    lookups[address] = enrich_pool.submit(enrich_safely, enricher, address)
+                waiting.append((record, address))
+
+            write_ready()
+
+        write_ready(block=True)
+
+    print (f'[+] {rows} records have been saved to {args.output_file}, {len(lookups)} addresses enriched')
     
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
@@ -165,7 +288,44 @@ if __name__ == "__main__":
         required=True
     )
 
+    parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="resolve names concurrently and stream rows to the output file"
+    )
+
+    parser.add_argument(
+        "-t",
+        "--threads",
+        type=int,
+        default=100,
+        help="concurrent resolutions in bulk mode"
+    )
+
+    parser.add_argument(
+        "-n",
+        "--nameservers",
+        help="comma separated nameservers or a file with one per line (bulk mode, default is the system resolver)"
+    )
+
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=5.0,
+        help="resolution timeout per query in seconds (bulk mode)"
+    )
+
+    parser.add_argument(
+        "--enrich-threads",
+        type=int,
+        default=4,
+        help="concurrent ip-db lookups in bulk mode, each waits the enricher delay before its request"
+    )
+
     args = parser.parse_args()
 
-    main(args)
+    if args.bulk:
+        bulk_main(args)
+    else:
+        main(args)
 
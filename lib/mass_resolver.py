@@ -1,11 +1,15 @@
+import logging
 import gc
 import json
 import subprocess
 import uuid
 import os
-from tld import get_tld, parse_tld
 from pathlib import Path
 
+from lib.cname_graph import CnameGraph
+
+log = logging.getLogger(__name__)
+
 
 def chunks(lst, n):
     """Yield successive n-sized chunks from lst."""
@@ -13,14 +17,22 @@ def chunks(lst, n):
         yield lst[i:i + n]
 
 class MassDnsResolver:
-    def __init__(self, trusted_resolvers_path, mass_resolvers_path, threads=10000, temp_directory_path='/tmp'):
+    def __init__(self, trusted_resolvers_path, mass_resolvers_path, threads=10000, temp_directory_path='/tmp', rate_controller=None, chunk_size=10000, scope=None):
         self.trusted_resolvers_path = trusted_resolvers_path
         self.mass_resolvers_path = mass_resolvers_path
         self.temp_directory_path = temp_directory_path
         self.threads = threads
+        self.chunk_size = chunk_size
+        #optional AimdController, massdns -s is taken from it for every chunk
+        self.rate_controller = rate_controller
+        #optional ScopeTrie, out-of-scope wildcard CNAME targets aren't resolved
+        self.scope = scope
+        self.cname_graph = CnameGraph()
             
 
     def _generate_fake_domains(self, domains):
+        from tld import get_tld
+
         fake_domains = set()
         wildcard_responses = []
         random = str(uuid.uuid4())
@@ -52,23 +64,25 @@ class MassDnsResolver:
 
         return [j.decode('utf-8').strip() for j in stdout.splitlines() if j != b'\n']
 
-    def _simple_resolve(self, domains, resolvers_path, types=['A','CNAME'], blacklist=[]):
+    def _simple_resolve(self, domains, resolvers_path, types=['A','CNAME'], blacklist=[], keep_ttl=False, statuses=None):
 
         #print ('Simple resolve was requested for domains:{}...'.format(domains[:20]))
         results_set = set()
 
-        step=10000
+        step = self.chunk_size
         i = 0
 
         for domains_chunk in chunks(domains, step):
             i+=1
-            print (i*step, len(domains))
+            log.info(f"{i*step} {len(domains)}")
+
+            threads = self.rate_controller.limit if self.rate_controller else self.threads
 
-            if len(results_set) > 10000:
-                print ('It looks that wildcard defense was bypassed, return nothing')
+            if len(results_set) > 10000 and not keep_ttl:
+                log.warning('It looks that wildcard defense was bypassed, return nothing')
                 return []
 
-            print ('simple chunk', len(domains_chunk))
+            log.info(f"simple chunk {len(domains_chunk)}")
             filename = str(uuid.uuid4())
             Path(self.temp_directory_path).mkdir(parents=True, exist_ok=True)
             temp_path = os.path.join(self.temp_directory_path, filename)
@@ -77,7 +91,7 @@ class MassDnsResolver:
 
             massdns_cmd = [
                 'massdns',
-                '-s', str(self.threads),
+                '-s', str(threads),
                 '-o', 'J',
                 '-r', resolvers_path,
                 '-w', temp_path,
@@ -91,10 +105,20 @@ class MassDnsResolver:
 
             self._exec_and_readlines(cmd=massdns_cmd, domains=domains_chunk)
 
+            responses = 0
+            servfails = 0
+
             with open(temp_path, 'r') as f:
                 for line in f:
                     m_response = json.loads(line.strip())
 
+                    responses += 1
+                    if m_response.get('status') == 'SERVFAIL':
+                        servfails += 1
+
+                    if statuses is not None:
+                        statuses.setdefault(m_response['name'].rstrip('.'), {})[m_response.get('type')] = m_response.get('status')
+
                     if not 'data' in m_response.keys() or not 'answers' in m_response['data']:
                         continue
 
@@ -116,6 +140,8 @@ class MassDnsResolver:
                             continue
 
                         response = (('name',name),('data',data),('type',answer['type']))
+                        if keep_ttl:
+                            response += (('ttl',answer.get('ttl', 0)),)
                         results_set.add(response)
 
             #print (results_set)
@@ -123,10 +149,26 @@ class MassDnsResolver:
             if os.path.exists(temp_path):
                 os.remove(temp_path)
 
+            if self.rate_controller:
+                #massdns doesn't write anything for queries which ran out of retries
+                queries = len(domains_chunk) * len(types)
+                self.rate_controller.update(queries=queries, timeouts=max(queries - responses, 0), servfails=servfails)
+
         results = [dict(result) for result in results_set]
 
         return results
 
+    def resolve_with_ttl(self, domains, types=['A','CNAME'], resolvers_path=None, statuses=None):
+        """Plain resolution of known names, records keep the answer TTL. No wildcard checks.
+
+        With a `statuses` dict the response status of every answered query is
+        stored as statuses[name][type]. Queries which timed out have no entry.
+        """
+        if not resolvers_path:
+            resolvers_path = self.trusted_resolvers_path
+
+        return self._simple_resolve(domains=domains, resolvers_path=resolvers_path, types=types, keep_ttl=True, statuses=statuses)
+
     def trusted_resolve(self, domains, types=['A','CNAME'], strict=True, ignore_wildcard = True):
         return self.mass_resolve(
             domains=domains,
@@ -163,13 +205,25 @@ class MassDnsResolver:
 
         results = self._simple_resolve(domains = domains, resolvers_path=resolvers_path, blacklist=blacklist, types=types)
 
-        #to add wildcart cname domains. dirty
+        #to add wildcart cname domains. every shared target is resolved once per resolver
         if blacklist:
             cname_blacklist = list(set([result['data'] for result in wildcard_results if result['type']=='CNAME']))
-            cname_results = self._simple_resolve(domains = cname_blacklist, resolvers_path=resolvers_path, blacklist=[], types=types)
+            if self.scope is not None:
+                cname_blacklist = [target for target in cname_blacklist if target in self.scope]
+            unresolved_targets = self.cname_graph.unresolved(cname_blacklist)
+
+            if unresolved_targets:
+                cname_results = self._simple_resolve(domains = unresolved_targets, resolvers_path=resolvers_path, blacklist=[], types=types)
+                self.cname_graph.add_records(cname_results)
+                self.cname_graph.resolved_targets.update(unresolved_targets)
+
+            results_set = set(tuple(result.items()) for result in results)
+            for target in cname_blacklist:
+                for result in self.cname_graph.records(target):
+                    if result['type'] not in types or tuple(result.items()) in results_set:
+                        continue
 
-            for result in cname_results:
-                if not result in results:
+                    results_set.add(tuple(result.items()))
                     results.append(result)
 
         if recheck:
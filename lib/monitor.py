@@ -0,0 +1,155 @@
+import os
+import csv
+import glob
+import heapq
+import json
+import time
+
+
+class Monitor:
+    """Re-resolve known names when their records expire and report what changed.
+
+    Names are kept in a heap ordered by the time they're due, which is the
+    lowest TTL of their records clamped to [min_interval, max_interval]. Every
+    cycle resolves at most `batch_size` due names, so the query rate stays
+    steady no matter how many names are watched.
+
+    massdns writes nothing for queries which timed out, so a name is compared
+    only when every type got an authoritative answer (NOERROR or NXDOMAIN).
+    Otherwise it's retried after `min_interval`, and its partial answer is
+    accepted after `max_misses` incomplete resolutions in a row.
+    """
+
+    def __init__(self, resolver, types=['A','CNAME'], diff_path=None, batch_size=5000, min_interval=300, max_interval=86400, missing_interval=3600, cycle_interval=10, max_misses=3):
+        self.resolver = resolver
+        self.types = types
+        self.diff_path = diff_path
+        self.batch_size = batch_size
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.missing_interval = missing_interval
+        self.cycle_interval = cycle_interval
+        self.max_misses = max_misses
+
+        self.state = {}
+        self.misses = {}
+        self.queue = []
+
+    def load_results(self, results_dir):
+        """Load names and their last known records from raw_*.csv results. Returns the number of names."""
+        for path in glob.glob(os.path.join(results_dir, 'raw_*.csv')):
+            with open(path, encoding='utf8') as f:
+                for row in csv.DictReader(f):
+                    records = self.state.setdefault(row['name'], set())
+                    if row.get('data') and row.get('type') in self.types:
+                        records.add((row['type'], row['data']))
+
+        now = time.time()
+        for name in self.state:
+            heapq.heappush(self.queue, (now, name))
+
+        return len(self.state)
+
+    def _next_due(self, now, ttls):
+        if not ttls:
+            return now + self.missing_interval
+
+        return now + min(max(min(ttls), self.min_interval), self.max_interval)
+
+    def _complete(self, statuses):
+        """True if the responses of a name are authoritative for every queried type."""
+        if 'NXDOMAIN' in statuses.values():
+            return True
+
+        return all(statuses.get(t) == 'NOERROR' for t in self.types)
+
+    def _diff(self, name, old, new, now):
+        if old == new:
+            return None
+
+        if not old:
+            event = 'new'
+        elif not new:
+            event = 'disappeared'
+        else:
+            event = 'changed'
+
+        return {
+            'time': round(now, 3),
+            'event': event,
+            'name': name,
+            'added': [{'type': t, 'data': d} for t, d in sorted(new - old)],
+            'removed': [{'type': t, 'data': d} for t, d in sorted(old - new)]
+        }
+
+    def _emit(self, diff):
+        print (json.dumps(diff))
+
+        if self.diff_path:
+            with open(self.diff_path, 'a', encoding='utf8') as f:
+                f.write(json.dumps(diff) + '\n')
+
+    def run_once(self, now=None):
+        """Resolve the names which are due. Returns the list of diffs."""
+        now = time.time() if now is None else now
+
+        due = []
+        while self.queue and self.queue[0][0] <= now and len(due) < self.batch_size:
+            due.append(heapq.heappop(self.queue)[1])
+
+        if not due:
+            return []
+
+        records = {}
+        ttls = {}
+        statuses = {}
+        for result in self.resolver.resolve_with_ttl(domains=due, types=self.types, statuses=statuses):
+            records.setdefault(result['name'], set()).add((result['type'], result['data']))
+            ttls.setdefault(result['name'], []).append(int(result['ttl']))
+
+        diffs = []
+        retried = 0
+        for name in due:
+            if not self._complete(statuses.get(name, {})):
+                self.misses[name] = self.misses.get(name, 0) + 1
+                if self.misses[name] < self.max_misses:
+                    heapq.heappush(self.queue, (now + self.min_interval, name))
+                    retried += 1
+                    continue
+
+            self.misses.pop(name, None)
+            new = records.get(name, set())
+            diff = self._diff(name, self.state.get(name, set()), new, now)
+            if diff:
+                diffs.append(diff)
+                self._emit(diff)
+
+            self.state[name] = new
+            heapq.heappush(self.queue, (self._next_due(now, ttls.get(name)), name))
+
+        #answers for chain targets (a CNAME moved to a new CDN) start watching them
+        targets = [name for name in records if name not in self.state]
+        for name in targets:
+            self.state[name] = records[name]
+            heapq.heappush(self.queue, (self._next_due(now, ttls.get(name)), name))
+
+        print (f"(*) Monitor: {len(due)} names re-resolved, {len(diffs)} changed, {retried} incomplete will be retried, {len(targets)} new chain targets, {len(self.queue)} watched")
+
+        return diffs
+
+    def run(self, cycles=None):
+        """Run forever, or for the given number of cycles."""
+        cycle = 0
+
+        while cycles is None or cycle < cycles:
+            started = time.time()
+            self.run_once(now=started)
+            cycle += 1
+
+            if not self.queue:
+                break
+
+            #sleep until the next name is due, but keep the cycle rate bounded
+            wait = max(self.queue[0][0] - time.time(), self.cycle_interval - (time.time() - started), 0)
+            if cycles is None or cycle < cycles:
+                time.sleep(wait)
@@ -0,0 +1,154 @@
+import logging
+import os
+import sys
+import time
+import threading
+import tracemalloc
+from collections import Counter
+
+log = logging.getLogger(__name__)
+
+MODES = ['sample', 'cprofile', 'mem']
+
+
+class _Sampler(threading.Thread):
+    """Statistical profiler: records the stack of the profiled thread every `interval` seconds."""
+
+    def __init__(self, interval):
+        threading.Thread.__init__(self, daemon=True)
+        self.interval = interval
+        self.active = None
+        self.samples = {}
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            active = self.active
+            if active is None:
+                continue
+
+            label, ident = active
+            frame = sys._current_frames().get(ident)
+            if frame is None:
+                continue
+
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+
+            self.samples.setdefault(label, Counter())[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class StageProfiler:
+    """Per-stage CPU and memory profiling.
+
+    Modes:
+      sample   - stack sampling thread, dumps flamegraph-compatible profile_<stage>.folded
+      cprofile - deterministic cProfile, dumps profile_<stage>.prof (pstats format)
+      mem      - tracemalloc on from the start to the end of every stage, top allocations go
+                 to profile_allocations.txt. Tracing slows everything down several times,
+                 so it's meant for diagnosing runs, not for leaving on.
+
+    Stages are generators: sampling and cProfile are switched on only while
+    the stage itself runs, not while its consumer handles the yielded records.
+    """
+
+    def __init__(self, output_dir, modes=('sample',), interval=0.01, frames=1, top=20):
+        self.output_dir = output_dir
+        self.modes = list(modes)
+        self.top = top
+        self.frames = frames
+        self.report_path = os.path.join(output_dir, 'profile_allocations.txt')
+
+        self._profiles = {}
+        self._sampler = None
+
+        if 'sample' in self.modes:
+            self._sampler = _Sampler(interval)
+            self._sampler.start()
+
+    def _resume(self, label):
+        if self._sampler:
+            self._sampler.active = (label, threading.get_ident())
+
+        if 'cprofile' in self.modes:
+            import cProfile
+
+            self._profiles.setdefault(label, cProfile.Profile()).enable()
+
+    def _pause(self, label):
+        if self._sampler:
+            self._sampler.active = None
+
+        if 'cprofile' in self.modes:
+            self._profiles[label].disable()
+
+    def wrap(self, label, iterable):
+        """Generator over `iterable` which profiles the work done inside it as stage `label`."""
+        iterator = iter(iterable)
+        snapshot = None
+        traced = False
+        if 'mem' in self.modes:
+            #tracing only between the stages' start and end keeps the rest of the run at full speed
+            traced = not tracemalloc.is_tracing()
+            if traced:
+                tracemalloc.start(self.frames)
+            tracemalloc.reset_peak()
+            snapshot = tracemalloc.take_snapshot()
+
+        started = time.time()
+        busy = 0.0
+
+        try:
+            while True:
+                self._resume(label)
+                resumed = time.time()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    busy += time.time() - resumed
+                    self._pause(label)
+
+                yield item
+        finally:
+            self._finish(label, snapshot, busy, time.time() - started)
+            if traced:
+                tracemalloc.stop()
+
+    def _finish(self, label, snapshot, busy, elapsed):
+        name = label.replace(os.sep, '_')
+
+        if 'cprofile' in self.modes and label in self._profiles:
+            self._profiles.pop(label).dump_stats(os.path.join(self.output_dir, f"profile_{name}.prof"))
+
+        if self._sampler and label in self._sampler.samples:
+            samples = self._sampler.samples.pop(label)
+            with open(os.path.join(self.output_dir, f"profile_{name}.folded"), 'w') as f:
+                for stack, count in samples.most_common():
+                    f.write(f"{stack} {count}\n")
+
+        lines = [f"== {label}: {busy:.2f}s in stage, {elapsed:.2f}s total"]
+
+        if snapshot is not None:
+            current, peak = tracemalloc.get_traced_memory()
+            lines.append(f"traced memory: {current / 1024 / 1024:.1f} MiB, stage peak {peak / 1024 / 1024:.1f} MiB")
+
+            stats = tracemalloc.take_snapshot().compare_to(snapshot, 'lineno')
+            for stat in stats[:self.top]:
+                lines.append(str(stat))
+
+        with open(self.report_path, 'a') as f:
+            f.write('\n'.join(lines) + '\n\n')
+
+        log.info(f"(*) Profile: {lines[0][3:]}")
+
+    def close(self):
+        if self._sampler:
+            self._sampler.stop()
@@ -0,0 +1,66 @@
+import logging
+import ipaddress
+import itertools
+
+log = logging.getLogger(__name__)
+
+
+def reverse_names(prefix, max_prefix=24, max_prefix_v6=120):
+    """Yield the reverse (PTR) names of every address of `prefix`, one at a time.
+
+    Networks larger than /max_prefix (IPv4) or /max_prefix_v6 (IPv6) are skipped.
+    """
+    try:
+        network = ipaddress.ip_network(prefix.strip(), strict=False)
+    except ValueError:
+        return
+
+    limit = max_prefix if network.version == 4 else max_prefix_v6
+    if network.prefixlen < limit:
+        log.info(f"(-) {network} is larger than /{limit}, skipped")
+        return
+
+    for address in network:
+        yield address.reverse_pointer
+
+
+class PtrSweep:
+    """Reverse DNS sweep of netblocks found by the enrichment.
+
+    Reverse names are generated lazily from the prefixes and resolved chunk by
+    chunk through the mass resolver. PTR names inside the scope are resolved
+    forward with the trusted resolvers and their records are yielded.
+    """
+
+    def __init__(self, resolver, scope, types=['A','CNAME'], max_prefix=24, max_prefix_v6=120, chunk_size=10000):
+        self.resolver = resolver
+        self.scope = scope
+        self.types = types
+        self.max_prefix = max_prefix
+        self.max_prefix_v6 = max_prefix_v6
+        self.chunk_size = chunk_size
+
+    def ptr_names(self, routes):
+        """In-scope names from the PTR records of every address in `routes`."""
+        names = itertools.chain.from_iterable(
+            reverse_names(route, self.max_prefix, self.max_prefix_v6) for route in sorted(set(routes)))
+
+        found = set()
+        while True:
+            chunk = list(itertools.islice(names, self.chunk_size))
+            if not chunk:
+                break
+
+            #reverse zones don't have wildcards, so don't waste queries on checks
+            for result in self.resolver.mass_resolve(domains=chunk, types=['PTR'], ignore_wildcard=False, recheck=False):
+                if result['type'] == 'PTR' and result['data'] in self.scope and result['data'] not in found:
+                    found.add(result['data'])
+                    yield result['data']
+
+    def sweep(self, routes):
+        """Yield forward records of in-scope names found in the PTR records of `routes`."""
+        names = list(self.ptr_names(routes))
+        log.info(f"(+) {len(names)} in-scope names were found in PTR records")
+
+        if names:
+            yield from self.resolver.trusted_resolve(domains=names, types=self.types)
@@ -0,0 +1,81 @@
+import logging
+import os
+import csv
+import time
+
+log = logging.getLogger(__name__)
+
+
+class AimdController:
+    """Additive-increase/multiplicative-decrease limit for concurrent queries.
+
+    The resolver reports every finished window (a massdns chunk) with the number
+    of queries sent, timed out and answered with SERVFAIL. While the failure
+    rate stays under `max_failure_rate` the limit grows by `increase`, otherwise
+    it's multiplied by `decrease`. Windows smaller than `min_queries` (wildcard
+    probes, CNAME target passes) are pooled until they add up to `min_queries`,
+    so a single timeout out of a couple of queries doesn't halve the limit.
+    """
+
+    FIELDNAMES = ['time', 'limit', 'queries', 'timeouts', 'servfails', 'failure_rate', 'next_limit']
+
+    def __init__(self, initial=1000, minimum=50, maximum=10000, increase=100, decrease=0.5, max_failure_rate=0.05, min_queries=500, log_path=None):
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.max_failure_rate = max_failure_rate
+        self.min_queries = min_queries
+        self.log_path = log_path
+        self.history = []
+        self._pending = [0, 0, 0]
+
+    def update(self, queries, timeouts, servfails):
+        """Account a finished window, returns the limit for the next one."""
+        if queries <= 0:
+            return self.limit
+
+        self._pending[0] += queries
+        self._pending[1] += timeouts
+        self._pending[2] += servfails
+        if self._pending[0] < self.min_queries:
+            return self.limit
+
+        queries, timeouts, servfails = self._pending
+        self._pending = [0, 0, 0]
+
+        failure_rate = (timeouts + servfails) / queries
+
+        if failure_rate > self.max_failure_rate:
+            next_limit = max(self.minimum, int(self.limit * self.decrease))
+        else:
+            next_limit = min(self.maximum, self.limit + self.increase)
+
+        entry = {
+            'time': round(time.time(), 3),
+            'limit': self.limit,
+            'queries': queries,
+            'timeouts': timeouts,
+            'servfails': servfails,
+            'failure_rate': round(failure_rate, 4),
+            'next_limit': next_limit
+        }
+        self.history.append(entry)
+        self._log(entry)
+
+        log.info(f"(*) Rate control: {queries} queries, {timeouts} timeouts, {servfails} SERVFAILs with {self.limit} in flight -> {next_limit}")
+
+        self.limit = next_limit
+        return self.limit
+
+    def _log(self, entry):
+        if not self.log_path:
+            return
+
+        write_header = not os.path.exists(self.log_path)
+        with open(self.log_path, 'a', encoding='utf8', newline='') as f:
+            fc = csv.DictWriter(f, fieldnames=self.FIELDNAMES)
+            if write_header:
+                fc.writeheader()
+            fc.writerow(entry)
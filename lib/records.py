@@ -0,0 +1,77 @@
+import sys
+
+DEFAULT_TYPES = ['A', 'CNAME']
+SUPPORTED_TYPES = ['A', 'AAAA', 'CNAME', 'MX', 'NS', 'TXT', 'PTR', 'SRV', 'CAA', 'SOA']
+
+
+def parse_types(value):
+    """Parse a comma separated record type list like 'A,AAAA,CNAME'."""
+    types = []
+    for t in value.split(','):
+        t = t.strip().upper()
+        if not t:
+            continue
+
+        if t not in SUPPORTED_TYPES:
+            raise ValueError(f"unsupported record type {t}, use any of {','.join(SUPPORTED_TYPES)}")
+
+        if t not in types:
+            types.append(t)
+
+    return types
+
+
+class RecordStore:
+    """Deduplicated records grouped by type, then by name.
+
+    Names are interned so the same name shared by several records and types is
+    stored once. Iteration yields records in the resolver format
+    ({'name','data','type'}) in insertion order within a type.
+    """
+
+    def __init__(self, records=None):
+        self._records = {}
+        self._count = 0
+
+        if records:
+            self.update(records)
+
+    def add(self, record):
+        """Add a record, returns False if it was already stored."""
+        names = self._records.setdefault(record['type'], {})
+        data = names.setdefault(sys.intern(record['name']), {})
+
+        if record['data'] in data:
+            return False
+
+        data[record['data']] = None
+        self._count += 1
+        return True
+
+    def update(self, records):
+        """Add records, returns the number of new ones."""
+        return sum(1 for record in records if self.add(record))
+
+    def names(self, types=None):
+        """Unique names, optionally only of the given record types."""
+        names = {}
+        for rtype, by_name in self._records.items():
+            if types is None or rtype in types:
+                names.update(dict.fromkeys(by_name))
+
+        return list(names)
+
+    def types(self):
+        return list(self._records)
+
+    def __contains__(self, record):
+        return record['data'] in self._records.get(record['type'], {}).get(record['name'], {})
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for rtype, by_name in self._records.items():
+            for name, data in by_name.items():
+                for d in data:
+                    yield {'name': name, 'data': d, 'type': rtype}
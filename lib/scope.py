@@ -0,0 +1,72 @@
+ROOT = '\0root'
+EXCLUDED = '\0excluded'
+
+
+def normalize(name):
+    return name.strip().lower().rstrip('.')
+
+
+class ScopeTrie:
+    """Label-reversed trie of in-scope root domains and excluded subtrees.
+
+    owner() walks the labels of a name from the TLD down, so mapping a name to
+    its root domain costs O(labels) no matter how many roots are in scope.
+    The deepest matching entry wins: with example.com in scope and
+    dev.example.com excluded, a.dev.example.com is out of scope, while
+    b.example.com belongs to example.com.
+    """
+
+    def __init__(self, roots=(), excludes=()):
+        self._trie = {}
+
+        for root in roots:
+            self.add(root)
+
+        for exclude in excludes:
+            self.exclude(exclude)
+
+    def _node(self, domain):
+        node = self._trie
+        for label in reversed(normalize(domain).split('.')):
+            node = node.setdefault(label, {})
+
+        return node
+
+    def add(self, root_domain):
+        node = self._node(root_domain)
+        node[ROOT] = normalize(root_domain)
+        node.pop(EXCLUDED, None)
+
+    def exclude(self, domain):
+        node = self._node(domain)
+        node[EXCLUDED] = True
+        node.pop(ROOT, None)
+
+    def _match(self, name):
+        """(root domain, excluded) of the deepest entry `name` falls under."""
+        owner = None
+        excluded = False
+        node = self._trie
+
+        for label in reversed(normalize(name).split('.')):
+            node = node.get(label)
+            if node is None:
+                break
+
+            if EXCLUDED in node:
+                owner, excluded = None, True
+            elif ROOT in node:
+                owner, excluded = node[ROOT], False
+
+        return owner, excluded
+
+    def owner(self, name):
+        """Root domain `name` belongs to, None if it's out of scope or excluded."""
+        return self._match(name)[0]
+
+    def excluded(self, name):
+        """True if `name` is in an excluded subtree, False for names in scope or outside every root."""
+        return self._match(name)[1]
+
+    def __contains__(self, name):
+        return self.owner(name) is not None
@@ -5,7 +5,18 @@ import queue
 import uuid
 import argparse
 import sys
-import requests
+import os
+import json
+import time
+import random
+import hashlib
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_DIR = os.path.normpath(os.path.join(os.path.realpath(os.path.dirname(__file__)), '..'))
+SOURCES_PATH = os.path.join(BASE_DIR, 'dicts', 'dns_resolver_sources.txt')
+STATE_PATH = os.path.join(BASE_DIR, 'dicts', 'mass_resolvers_state.json')
+SOURCES_CACHE_DIR = os.path.join(BASE_DIR, 'temp', 'resolver_sources')
 
 class DNSWorker(threading.Thread):
 
@@ -102,6 +113,121 @@ class DnsResolverProvider():
 
         return output_list
 
+class ResolverState():
+    """Last check time and result of every known resolver, persisted as JSON."""
+
+    def __init__(self, path):
+        self.path = path
+        self.resolvers = {}
+
+        if os.path.exists(path):
+            with open(path) as f:
+                self.resolvers = json.load(f)
+
+    def is_stale(self, resolver, max_age, now):
+        entry = self.resolvers.get(resolver)
+        return entry is None or now - entry['checked'] > max_age
+
+    def update(self, checked, good, now):
+        good = set(good)
+        for resolver in checked:
+            self.resolvers[resolver] = {'checked': now, 'good': resolver in good}
+
+    def good(self, within=None):
+        """Good resolvers, optionally only those from `within`."""
+        return sorted(r for r, entry in self.resolvers.items() if entry['good'] and (within is None or r in within))
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.resolvers, f)
+
+        os.replace(tmp_path, self.path)
+
+def refresh_resolvers(provider, candidates, state, max_age=7*86400, sample_size=50, full=False):
+    """Validate new and stale candidates plus a random sample of known-good resolvers.
+
+    Returns the list of resolvers which were checked this time.
+    """
+    now = time.time()
+    candidates = set(c.strip() for c in candidates if c.strip())
+
+    if full:
+        to_check = candidates
+    else:
+        to_check = set(c for c in candidates if state.is_stale(c, max_age, now))
+
+        #good resolvers go bad without notice, recheck some of them every time
+        known_good = [r for r in state.good() if r not in to_check]
+        to_check.update(random.sample(known_good, min(sample_size, len(known_good))))
+
+    print ("(.) {0} of {1} candidates need a check".format(len(to_check), len(candidates)))
+
+    good = provider.get_good_resolvers(resolver_list=list(to_check)) if to_check else []
+    state.update(to_check, good, now)
+
+    return list(to_check)
+
+def fetch_sources(sources, cache_dir, threads=10, timeout=30):
+    """Download resolver lists concurrently with conditional requests.
+
+    Bodies and their ETag/Last-Modified are kept in cache_dir, a 304 reply or a
+    failed download falls back to the cached copy. Returns the candidate list.
+    """
+    import requests
+
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    meta_path = os.path.join(cache_dir, 'sources.json')
+
+    meta = {}
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+
+    def fetch(url):
+        entry = meta.get(url, {})
+        body_path = os.path.join(cache_dir, hashlib.sha1(url.encode()).hexdigest() + '.txt')
+
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+
+        try:
+            r = requests.get(url, headers=headers, timeout=timeout)
+        except requests.RequestException as err:
+            print ("(-) {0}: {1}, using the cached copy".format(url, err))
+            r = None
+
+        if r is not None and r.status_code == 200:
+            with open(body_path, 'w') as f:
+                f.write(r.text)
+            entry = {'etag': r.headers.get('ETag'), 'last_modified': r.headers.get('Last-Modified')}
+            status = 'updated'
+        elif r is not None and r.status_code == 304:
+            status = 'not modified'
+        else:
+            status = 'cached'
+
+        if not os.path.exists(body_path):
+            return url, entry, status, []
+
+        with open(body_path) as f:
+            return url, entry, status, [s.strip() for s in f if s.strip()]
+
+    resolver_list = []
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for url, entry, status, candidates in executor.map(fetch, sources):
+            meta[url] = entry
+            resolver_list += candidates
+            print ("(+) Got {0} candidates from {1} ({2})".format(len(candidates), url, status))
+
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+
+    return resolver_list
+
 def parser_error(errmsg):
     print("Usage: python " + sys.argv[0] + " [Options] use -h for help")
     print("Error: " + errmsg)
@@ -116,11 +242,19 @@ def parse_args():
     parser.add_argument('-o', '--output', help="output file path", required=True)
     parser.add_argument('-t', '--threads', help="checkers count", type=int, default = 20)
     parser.add_argument('-u', help="update from public sources", action='store_true')
+    parser.add_argument('-s', '--sources', help="file with resolver list urls", default=SOURCES_PATH)
+    parser.add_argument('--state', help="resolver check state file", default=STATE_PATH)
+    parser.add_argument('--max-age', help="days after which a resolver is checked again", type=float, default=7)
+    parser.add_argument('--sample', help="known-good resolvers rechecked on every refresh", type=int, default=50)
+    parser.add_argument('--full', help="check every candidate regardless of the state", action='store_true')
 
     return parser.parse_args()
     
 def main():
+    args = parse_args()
+
     dns_provider = DnsResolverProvider(args.threads)
+    state = ResolverState(args.state)
     resolver_list = []
 
     if args.local_file:
@@ -128,30 +262,33 @@ def main():
             resolver_list += [s.strip() for s in f.readlines()]
 
     if args.u:
-        with open ("sources.txt") as f:
-            sources = [s.strip() for s in f.readlines()]
+        with open (args.sources) as f:
+            sources = [s.strip() for s in f.readlines() if s.strip()]
         print ("(.) Loading the external list...")
 
-        for s in sources:
-            candidates = requests.get(s).text.split("\n")
-            resolver_list += candidates
-            print ("(+) Got {0} candidates from {1}".format(len(candidates), s))
+        resolver_list += fetch_sources(sources, cache_dir=SOURCES_CACHE_DIR)
 
     candidate_resolver_list = list(set(resolver_list))
     print ("(.) Unique candidates to test: {0}".format(len(candidate_resolver_list)))
 
-    good_resolvers = dns_provider.get_good_resolvers(resolver_list=candidate_resolver_list)
-    
+    checked = refresh_resolvers(
+        provider=dns_provider,
+        candidates=candidate_resolver_list,
+        state=state,
+        max_age=args.max_age * 86400,
+        sample_size=args.sample,
+        full=args.full)
+    state.save()
+
+    good_resolvers = state.good(within=set(candidate_resolver_list))
+
     if args.output:
         with open(args.output,'w') as f:
             for resolver in good_resolvers:
                 f.write("{0}\n".format(resolver))
 
-    
-
-
-    print ("(+) {0} candidates were checked".format(len(candidate_resolver_list)))
+    print ("(+) {0} candidates were checked".format(len(checked)))
     print ("(+) {0} good resolvers have been added to {1}".format(len(good_resolvers),args.output))
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
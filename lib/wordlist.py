@@ -0,0 +1,194 @@
+import os
+import re
+import csv
+import mmap
+import glob
+import struct
+import sys
+import argparse
+
+# Compiled wordlist layout (little-endian):
+#   header  : magic (4s) | version (H) | count (I)
+#   offsets : count * I, absolute offset of every entry
+#   entries : length (B) | label bytes (ascii)
+MAGIC = b'DNSW'
+VERSION = 1
+HEADER = struct.Struct('<4sHI')
+OFFSET = struct.Struct('<I')
+
+MAX_LABEL_LENGTH = 63
+MAX_NAME_LENGTH = 253
+
+LABEL_RE = re.compile(r'^[a-z0-9_](?:[a-z0-9_-]*[a-z0-9_])?$')
+
+
+def normalize_label(word):
+    """Return a normalized wordlist entry or None if it's not a valid DNS name prefix."""
+    word = word.strip().lower().strip('.')
+    if not word or len(word) > MAX_NAME_LENGTH:
+        return None
+
+    for label in word.split('.'):
+        if len(label) > MAX_LABEL_LENGTH or not LABEL_RE.match(label):
+            return None
+
+    return word
+
+def normalize_words(words):
+    """Normalize and deduplicate words preserving the original order."""
+    seen = set()
+    result = []
+
+    for word in words:
+        word = normalize_label(word)
+        if word is None or word in seen:
+            continue
+
+        seen.add(word)
+        result.append(word)
+
+    return result
+
+def count_hits(results_dir):
+    """Count how often every subdomain prefix was found in previous raw_<domain>.csv results."""
+    hits = {}
+
+    for path in glob.glob(os.path.join(results_dir, 'raw_*.csv')):
+        root_domain = os.path.basename(path)[len('raw_'):-len('.csv')]
+        suffix = '.' + root_domain
+        names = set()
+
+        with open(path, encoding='utf8') as f:
+            for row in csv.DictReader(f):
+                name = row.get('name', '').lower()
+                if name.endswith(suffix):
+                    names.add(name[:-len(suffix)])
+
+        for name in names:
+            hits[name] = hits.get(name, 0) + 1
+
+    return hits
+
+def compile_wordlist(src_path, dst_path, hits=None):
+    """Compile a text wordlist into the binary format. Returns the number of entries written."""
+    with open(src_path, encoding='utf8', errors='ignore') as f:
+        words = normalize_words(f)
+
+    if hits:
+        # sorted() is stable, so words without hits keep their original order
+        words = sorted(words, key=lambda w: -hits.get(w, 0))
+
+    encoded = [w.encode('ascii') for w in words]
+
+    offsets = []
+    offset = HEADER.size + OFFSET.size * len(encoded)
+    for word in encoded:
+        offsets.append(offset)
+        offset += 1 + len(word)
+
+    with open(dst_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(encoded)))
+        f.write(b''.join(OFFSET.pack(o) for o in offsets))
+        f.write(b''.join(bytes([len(w)]) + w for w in encoded))
+
+    return len(encoded)
+
+
+class CompiledWordlist:
+    """Read-only, mmap backed view of a compiled wordlist."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self._count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mm.close()
+            raise ValueError(f"{path} is not a compiled wordlist")
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+
+        offset, = OFFSET.unpack_from(self._mm, HEADER.size + OFFSET.size * index)
+        length = self._mm[offset]
+        return self._mm[offset + 1:offset + 1 + length].decode('ascii')
+
+    def __iter__(self):
+        offset = HEADER.size + OFFSET.size * self._count
+        mm = self._mm
+        for _ in range(self._count):
+            length = mm[offset]
+            yield mm[offset + 1:offset + 1 + length].decode('ascii')
+            offset += 1 + length
+
+    def close(self):
+        self._mm.close()
+
+
+def is_compiled(path):
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+def open_words(path):
+    """Sequence of the words of a wordlist: a CompiledWordlist view without copying, or a list for text."""
+    if is_compiled(path):
+        return CompiledWordlist(path)
+
+    with open(path, encoding='utf8', errors='ignore') as f:
+        return [s.strip() for s in f if s.strip()]
+
+def load_words(path):
+    """Load a wordlist, either compiled or plain text, into a list."""
+    words = open_words(path)
+    if isinstance(words, CompiledWordlist):
+        wordlist = words
+        words = list(wordlist)
+        wordlist.close()
+
+    return words
+
+def compiled_path(path):
+    return os.path.splitext(path)[0] + '.bin'
+
+def prefer_compiled(path):
+    """Return the compiled sibling of a text wordlist if it exists and is up to date."""
+    bin_path = compiled_path(path)
+    if bin_path != path and os.path.exists(bin_path) and os.path.getmtime(bin_path) >= os.path.getmtime(path):
+        return bin_path
+
+    return path
+
+
+def parser_error(errmsg):
+    print("Usage: python " + sys.argv[0] + " [Options] use -h for help")
+    print("Error: " + errmsg)
+    sys.exit()
+
+def parse_args():
+    # parse the arguments
+    parser = argparse.ArgumentParser(epilog='\tExample: \r\npython3 ' + sys.argv[0] + ' -i words.txt -o words.bin')
+    parser.error = parser_error
+    parser._optionals.title = "OPTIONS"
+    parser.add_argument('-i', '--input', help="text wordlist", required=True)
+    parser.add_argument('-o', '--output', help="compiled wordlist path")
+    parser.add_argument('--hits-dir', help="directory with raw_*.csv results used for frequency ordering")
+
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    output = args.output or compiled_path(args.input)
+    hits = count_hits(args.hits_dir) if args.hits_dir else None
+
+    count = compile_wordlist(args.input, output, hits=hits)
+    print ("(+) {0} labels have been compiled to {1}".format(count, output))
+
+if __name__ == '__main__':
+    main()